@@ -1,13 +1,22 @@
 import os
+import time
+import logging
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from fastapi import Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
 from bson import ObjectId
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 from pydantic import BaseModel, Field, GetJsonSchemaHandler, SerializationInfo
 from pydantic_core import core_schema
+
+from app.db.sqlite_pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
 # ================= Model ========================
 
 class PyObjectId(ObjectId):
@@ -87,56 +96,119 @@ class ShowUserModel(BaseModel):
 DB_PATH = f"{str(Path(__file__).parent.parent.parent)}/db/api_keys.db"
 
 # Create database and table if they don't exist
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS api_keys (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_name TEXT NOT NULL,
-            role TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            api_key TEXT NOT NULL UNIQUE)
-        ''')
-        conn.commit()
-
-# Initialize the database when this module is imported
-init_db()
+def init_db(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS api_keys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_name TEXT NOT NULL,
+        role TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        api_key TEXT NOT NULL UNIQUE)
+    ''')
+
+# Per-process pool of reusable connections; the table is created lazily
+# by the first connection instead of at import time in every worker
+api_keys_pool = SQLitePool(
+    DB_PATH,
+    size=int(os.environ.get('_API_KEYS_POOL_SIZE_', 4)),
+    on_init=init_db,
+)
 
 # Header where the API key should be provided
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key")
 
+class ApiKeyCache:
+    """Bounded TTL/LRU cache of api_key -> (active, user_name, role).
+
+    Unknown keys are cached too (as None) with a shorter TTL so floods of
+    bad keys don't hit the database.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str):
+        """Return (hit, value); value is None for a cached unknown key"""
+        with self._lock:
+            item = self._data.get(api_key)
+            if item is None:
+                return False, None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[api_key]
+                return False, None
+            self._data.move_to_end(api_key)
+            return True, value
+
+    def set(self, api_key: str, value: Optional[Tuple[bool, str, str]]):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._data[api_key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(api_key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, api_key: Optional[str] = None):
+        with self._lock:
+            if api_key is None:
+                self._data.clear()
+            else:
+                self._data.pop(api_key, None)
+
+
+api_key_cache = ApiKeyCache(
+    maxsize=int(os.environ.get('_API_KEY_CACHE_SIZE_', 1024)),
+    ttl=float(os.environ.get('_API_KEY_CACHE_TTL_', 300)),
+    negative_ttl=float(os.environ.get('_API_KEY_CACHE_NEG_TTL_', 30)),
+)
+
+
+def invalidate_api_key_cache(api_key: Optional[str] = None):
+    """Drop one key (or the whole cache) after a user is created or changed"""
+    api_key_cache.invalidate(api_key)
+
+
+def lookup_api_key(api_key: str) -> Optional[Tuple[bool, str, str]]:
+    """Return (active, user_name, role) for an API key, or None if unknown"""
+    hit, value = api_key_cache.get(api_key)
+    if hit:
+        return value
+
+    with api_keys_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT is_active, user_name, role FROM api_keys WHERE api_key = ?',
+            (api_key,)
+        )
+        result = cursor.fetchone()
+
+    value = (str(result[0]).lower() == 'true', result[1], result[2]) if result else None
+    api_key_cache.set(api_key, value)
+    return value
+
 def verify_api_key(api_key: str) -> bool:
     """Verify if the provided API key is valid"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            sql=f"SELECT 1 FROM api_keys WHERE api_key = '{api_key}' AND is_active = 'true'"
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            if int(result[0]) == 1:
-                return True
-            else:
-                return False
+        result = lookup_api_key(api_key)
+        return result is not None and result[0]
     except Exception as e:
-        print(f"Error verifying API key: {e}")
+        logger.error("Error verifying API key: %s", e)
         return False
 
 def get_api_key_user(api_key: str) -> str:
     """Get the user ID associated with an API key"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT user_name FROM api_keys WHERE api_key = ?',
-                (api_key,)
-            )
-            result = cursor.fetchone()
-            return result[0] if result else None
+        result = lookup_api_key(api_key)
+        return result[1] if result else None
     except Exception as e:
-        print(f"Error getting API key user: {e}")
+        logger.error("Error getting API key user: %s", e)
         return None
 
 # This dependency can be used in FastAPI routes
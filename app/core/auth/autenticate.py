@@ -28,7 +28,7 @@ router = APIRouter()
 # Own Libs
 
 import sqlite3
-from .api_key_auth import get_api_key, verify_api_key, get_api_key_user,UserModel,DB_PATH,ShowUserModel
+from .api_key_auth import get_api_key, verify_api_key, get_api_key_user,UserModel,ShowUserModel,invalidate_api_key_cache,api_keys_pool
 
 
 # ================= Routes ========================
@@ -70,7 +70,7 @@ async def create_user(user: UserModel):
         }
         
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with api_keys_pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 # Check if user already exists
@@ -96,6 +96,7 @@ async def create_user(user: UserModel):
                     user_data['api_keys']
                 ))
                 conn.commit()
+                invalidate_api_key_cache(user_data['api_keys'])
                 
                 # Get the created user
                 cursor.execute(
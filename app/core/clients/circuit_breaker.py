@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+from typing import Dict, Optional
+
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker por upstream y por proceso: tras N fallas seguidas se abre
+# y las llamadas fallan al instante; pasado el reset deja pasar una sola
+# llamada de prueba (half-open) que decide si se cierra o vuelve a abrirse.
+
+CERRADO = "closed"
+ABIERTO = "open"
+SEMI_ABIERTO = "half_open"
+_VALOR_ESTADO = {CERRADO: 0, SEMI_ABIERTO: 1, ABIERTO: 2}
+
+trips = metrics.counter("circuit_breaker_trips_total", "Aperturas del circuit breaker", ("upstream",))
+rejected = metrics.counter("circuit_breaker_rejected_total", "Llamadas rechazadas con el circuito abierto", ("upstream",))
+
+
+class CircuitBreaker:
+    """closed -> open tras `failures` fallas seguidas; open -> half_open tras `reset_timeout` segundos"""
+
+    def __init__(self, name: str, failures: int, reset_timeout: float):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.estado = CERRADO
+        self._fallas = 0
+        self._abierto_en = 0.0
+        self._sonda_en: Optional[float] = None
+
+    def permitir(self) -> bool:
+        """True si la llamada puede salir; con el circuito abierto se rechaza sin esperar"""
+        now = time.monotonic()
+        if self.estado == ABIERTO and now - self._abierto_en >= self.reset_timeout:
+            self.estado = SEMI_ABIERTO
+            self._sonda_en = None
+            logger.info("Circuito de %s en half-open: se prueba una llamada", self.name)
+
+        if self.estado == CERRADO:
+            return True
+        # Una sola sonda a la vez; si quedó colgada (cancelada) se permite otra tras el reset
+        if self.estado == SEMI_ABIERTO and (self._sonda_en is None or now - self._sonda_en >= self.reset_timeout):
+            self._sonda_en = now
+            return True
+
+        rejected.inc(self.name)
+        return False
+
+    def exito(self):
+        if self.estado != CERRADO:
+            logger.info("Circuito de %s cerrado: el upstream respondió", self.name)
+        self.estado = CERRADO
+        self._fallas = 0
+        self._sonda_en = None
+
+    def fallo(self):
+        if self.failures <= 0:
+            # failures=0 desactiva el breaker
+            return
+        self._fallas += 1
+        if self.estado == SEMI_ABIERTO or (self.estado == CERRADO and self._fallas >= self.failures):
+            self._abrir()
+
+    def descartar(self):
+        """La llamada no llegó al upstream (cancelada o sin turno): no cuenta como éxito ni falla"""
+        if self.estado == SEMI_ABIERTO:
+            self._sonda_en = None
+
+    def _abrir(self):
+        self.estado = ABIERTO
+        self._abierto_en = time.monotonic()
+        self._sonda_en = None
+        trips.inc(self.name)
+        logger.warning("Circuito de %s abierto tras %s fallas; se reintenta en %.0fs",
+                       self.name, self._fallas, self.reset_timeout)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    if upstream not in _breakers:
+        prefijo = f"_BREAKER_{upstream.upper()}_"
+        _breakers[upstream] = CircuitBreaker(
+            upstream,
+            failures=int(os.environ.get(prefijo + 'FAILURES_', 5)),
+            reset_timeout=float(os.environ.get(prefijo + 'RESET_', 30)),
+        )
+    return _breakers[upstream]
+
+
+def breaker_states() -> dict:
+    """Estado de cada breaker para /metrics: 0 closed, 1 half_open, 2 open"""
+    return {name: _VALOR_ESTADO[b.estado] for name, b in _breakers.items()}
@@ -0,0 +1,263 @@
+import os
+import time
+import asyncio
+import logging
+import httpx
+from typing import Callable, Optional, Dict, Any
+
+from app.core.clients.http_client import get_http_client
+from app.utilities import json_backend
+from app.core.observability import metrics
+from app.core.clients import llm_cache
+from app.core.clients.single_flight import single_flight, coalesce_enabled
+from app.core.clients.rate_limiter import limitar, penalizar, LimiteExcedido
+from app.core.clients.circuit_breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+
+def _gemini_timeout() -> float:
+    return float(os.environ.get('_GEMINI_TIMEOUT_', 60))
+
+
+class GeminiNoDisponible(Exception):
+    """Gemini no entregó respuesta.
+
+    motivo: circuit_open, rate_limited, timeout, error (transporte) o http_<status>.
+    reintentable indica si vale la pena volver a intentar más tarde: el
+    circuito abierto, los timeouts, los 5xx y el 429 sí; otro 4xx no.
+    """
+
+    def __init__(self, motivo: str, reintentable: bool):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.reintentable = reintentable
+
+
+def _por_status(status: int) -> GeminiNoDisponible:
+    return GeminiNoDisponible(f"http_{status}", status >= 500 or status == 429)
+
+
+def respuesta_diferida_enabled() -> bool:
+    """Si Gemini no responde, la respuesta al mensaje se encola para más tarde"""
+    return os.environ.get('_GEMINI_REPLY_LATER_', '1').lower() not in ('0', 'false', 'no')
+
+
+async def enviar_accion(payload: Dict[str, Any], timeout: Optional[float] = None,
+                        usar_cache: bool = True) -> str:
+    """Envía el mensaje al API de Gemini (/pf/geminia/accion) y devuelve la respuesta del modelo.
+
+    Si la misma pregunta ya se respondió en el mismo alcance dentro del TTL
+    se devuelve la respuesta cacheada sin llamar al API. Sin respuesta lanza
+    GeminiNoDisponible con el motivo.
+    """
+    usar_cache = usar_cache and llm_cache.cache_enabled()
+    if usar_cache:
+        cacheada = llm_cache.buscar(payload)
+        if cacheada is not None:
+            return cacheada
+
+    if coalesce_enabled():
+        # Prompts idénticos concurrentes comparten una sola llamada al API;
+        # con la caché activa el líder además guarda la respuesta en ella
+        timeout = timeout if timeout is not None else _gemini_timeout()
+        return await single_flight.ejecutar(
+            llm_cache.clave_cache(payload),
+            lambda: _llamar_gemini(payload, timeout),
+            duracion=timeout + 5,
+            cache_ttl=llm_cache.ttl() if usar_cache else 0,
+        )
+
+    respuesta = await _llamar_gemini(payload, timeout)
+    if usar_cache:
+        llm_cache.guardar(payload, respuesta)
+    return respuesta
+
+
+async def _llamar_gemini(payload: Dict[str, Any], timeout: Optional[float]) -> str:
+    breaker = get_breaker("gemini")
+    if not breaker.permitir():
+        logger.warning("Circuito de GEMINI abierto, no se llama al API")
+        raise GeminiNoDisponible("circuit_open", True)
+
+    url = f"{str(os.environ.get('_URL_PF_API_GEMINAI_'))}/pf/geminia/accion"
+    headers = {'X-API-Key': os.environ.get('_API_KEY_PF_', '')}
+    deadline = timeout if timeout is not None else _gemini_timeout()
+
+    inicio = time.perf_counter()
+    enviado = False
+    try:
+        # Deadline total de la llamada (turno en el limitador + request completo);
+        # el timeout de httpx solo acota cada fase por separado
+        async with asyncio.timeout(deadline):
+            async with limitar("gemini"):
+                enviado = True
+                inicio = time.perf_counter()
+                resp = await get_http_client().post(
+                    url,
+                    content=json_backend.dumps(payload),
+                    headers={**headers, "Content-Type": "application/json"},
+                    timeout=deadline
+                )
+    except LimiteExcedido as e:
+        breaker.descartar()
+        logger.error("Sin turno para llamar al API GEMINI: %s", e)
+        raise GeminiNoDisponible("rate_limited", True) from e
+    except (TimeoutError, httpx.TimeoutException) as e:
+        if not enviado:
+            breaker.descartar()
+            logger.error("Deadline agotado esperando turno para el API GEMINI")
+            raise GeminiNoDisponible("rate_limited", True) from e
+        breaker.fallo()
+        metrics.llamada_saliente("gemini", "timeout", time.perf_counter() - inicio)
+        logger.error("Timeout llamando al API GEMINI")
+        raise GeminiNoDisponible("timeout", True) from e
+    except httpx.HTTPError as e:
+        breaker.fallo()
+        metrics.llamada_saliente("gemini", "error", time.perf_counter() - inicio)
+        logger.error("Error llamando al API GEMINI: %s", e)
+        raise GeminiNoDisponible("error", True) from e
+    except BaseException:
+        breaker.descartar()
+        raise
+
+    metrics.llamada_saliente("gemini", "ok" if resp.status_code == 201 else f"http_{resp.status_code}",
+                             time.perf_counter() - inicio)
+    _registrar_status(breaker, resp)
+    if resp.status_code != 201:
+        logger.warning("API GEMINI respondió %s", resp.status_code)
+        raise _por_status(resp.status_code)
+
+    return json_backend.loads(resp.content)['message']
+
+
+def _registrar_status(breaker, resp: httpx.Response):
+    """Veredicto del breaker y penalización del limitador según el status"""
+    if resp.status_code == 429:
+        try:
+            penalizar("gemini", float(resp.headers.get("retry-after", 1)))
+        except ValueError:
+            penalizar("gemini", 1.0)
+    # 5xx y 429 indican un upstream degradado; un 4xx es problema del request
+    if resp.status_code >= 500 or resp.status_code == 429:
+        breaker.fallo()
+    else:
+        breaker.exito()
+
+
+class RespuestaIncompleta(Exception):
+    """El stream de Gemini se cortó después de entregar parte de la respuesta"""
+
+    def __init__(self, parcial: str, motivo: str):
+        super().__init__(motivo)
+        self.parcial = parcial
+
+
+def streaming_enabled() -> bool:
+    return os.environ.get('_GEMINI_STREAM_', '0').lower() in ('1', 'true', 'yes')
+
+
+def _aplicar_fragmento(texto: str, linea: str) -> str:
+    """Un fragmento es JSON con "delta" (se agrega) o "message" (texto acumulado), o texto plano"""
+    try:
+        data = json_backend.loads(linea)
+    except json_backend.JSONDecodeError:
+        return texto + linea
+    if isinstance(data, dict):
+        if "delta" in data:
+            return texto + str(data["delta"])
+        if "message" in data:
+            return str(data["message"])
+    return texto + (data if isinstance(data, str) else linea)
+
+
+async def enviar_accion_stream(payload: Dict[str, Any], on_texto: Callable[[str], None],
+                               timeout: Optional[float] = None, usar_cache: bool = True) -> Optional[str]:
+    """Como enviar_accion, pero pide la respuesta en streaming (NDJSON o SSE).
+
+    on_texto(texto_acumulado) se llama con cada fragmento y no debe bloquear.
+    Devuelve el texto completo (None si llegó vacío) o lanza GeminiNoDisponible
+    si el API no respondió. Si el stream se corta a mitad lanza
+    RespuestaIncompleta con lo recibido. Si el API no soporta streaming y
+    responde JSON, se entrega todo en un solo fragmento.
+    """
+    usar_cache = usar_cache and llm_cache.cache_enabled()
+    if usar_cache:
+        cacheada = llm_cache.buscar(payload)
+        if cacheada is not None:
+            on_texto(cacheada)
+            return cacheada
+
+    breaker = get_breaker("gemini")
+    if not breaker.permitir():
+        logger.warning("Circuito de GEMINI abierto, no se llama al API")
+        raise GeminiNoDisponible("circuit_open", True)
+
+    url = f"{str(os.environ.get('_URL_PF_API_GEMINAI_'))}/pf/geminia/accion"
+    headers = {
+        'X-API-Key': os.environ.get('_API_KEY_PF_', ''),
+        "Content-Type": "application/json",
+        "Accept": "application/x-ndjson, text/event-stream;q=0.9, application/json;q=0.5",
+    }
+    deadline = timeout if timeout is not None else _gemini_timeout()
+
+    inicio = time.perf_counter()
+    enviado = False
+    texto = ""
+    try:
+        async with asyncio.timeout(deadline):
+            async with limitar("gemini"):
+                enviado = True
+                inicio = time.perf_counter()
+                async with get_http_client().stream("POST", url, content=json_backend.dumps(payload),
+                                                    headers=headers, timeout=deadline) as resp:
+                    if resp.status_code not in (200, 201):
+                        await resp.aread()
+                        metrics.llamada_saliente("gemini", f"http_{resp.status_code}", time.perf_counter() - inicio)
+                        _registrar_status(breaker, resp)
+                        logger.warning("API GEMINI respondió %s", resp.status_code)
+                        raise _por_status(resp.status_code)
+
+                    tipo = resp.headers.get("content-type", "")
+                    if "ndjson" in tipo or "event-stream" in tipo:
+                        async for linea in resp.aiter_lines():
+                            linea = linea.strip()
+                            if linea.startswith("data:"):
+                                linea = linea[5:].strip()
+                            if not linea or linea.startswith(":") or linea.startswith("event:"):
+                                continue
+                            if linea == "[DONE]":
+                                break
+                            texto = _aplicar_fragmento(texto, linea)
+                            on_texto(texto)
+                    else:
+                        texto = json_backend.loads(await resp.aread())['message']
+                        on_texto(texto)
+    except LimiteExcedido as e:
+        breaker.descartar()
+        logger.error("Sin turno para llamar al API GEMINI: %s", e)
+        raise GeminiNoDisponible("rate_limited", True) from e
+    except (TimeoutError, httpx.HTTPError) as e:
+        if not enviado:
+            breaker.descartar()
+            logger.error("Deadline agotado esperando turno para el API GEMINI")
+            raise GeminiNoDisponible("rate_limited", True) from e
+        breaker.fallo()
+        es_timeout = isinstance(e, (TimeoutError, httpx.TimeoutException))
+        metrics.llamada_saliente("gemini", "timeout" if es_timeout else "error", time.perf_counter() - inicio)
+        logger.error("Stream de GEMINI interrumpido: %s", type(e).__name__)
+        if texto:
+            raise RespuestaIncompleta(texto, type(e).__name__) from e
+        raise GeminiNoDisponible("timeout" if es_timeout else "error", True) from e
+    except GeminiNoDisponible:
+        # Status de error: el breaker ya tiene su veredicto
+        raise
+    except BaseException:
+        breaker.descartar()
+        raise
+
+    metrics.llamada_saliente("gemini", "ok", time.perf_counter() - inicio)
+    breaker.exito()
+    if usar_cache and texto:
+        llm_cache.guardar(payload, texto)
+    return texto or None
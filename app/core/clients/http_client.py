@@ -0,0 +1,31 @@
+import os
+import logging
+import httpx
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Cliente HTTP asíncrono compartido por todo el proceso (pool de conexiones keep-alive)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Devuelve el cliente asíncrono compartido, creándolo la primera vez"""
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=int(os.environ.get('_HTTP_MAX_CONNECTIONS_', 100)),
+            max_keepalive_connections=int(os.environ.get('_HTTP_MAX_KEEPALIVE_', 20)),
+            keepalive_expiry=float(os.environ.get('_HTTP_KEEPALIVE_EXPIRY_', 30)),
+        )
+        timeout = httpx.Timeout(float(os.environ.get('_HTTP_TIMEOUT_', 30)), connect=10.0)
+        _client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return _client
+
+
+async def close_http_client():
+    """Cierra el pool de conexiones (se llama al apagar la aplicación)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
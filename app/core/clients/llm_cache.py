@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.db.sqlite_pool import SQLitePool
+from app.utilities import json_backend
+from app.utilities.mention_matcher import quitar_menciones
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Caché de respuestas del modelo: memoria (LRU por proceso) delante de una
+# tabla SQLite compartida por los workers. La clave es el prompt normalizado
+# más el alcance (proyecto/usuario) y el resto de los campos del payload.
+base_dir = Path(__file__).resolve().parent.parent.parent.parent
+LLM_CACHE_DB_PATH = base_dir / "develop_db" / "llm_cache.db"
+
+# Campos del payload que no forman parte de la clave o tienen tratamiento propio
+_CAMPOS_ALCANCE = {"message", "id_project", "id_usuario", "nombre_usuario", "nombre_proyecto"}
+_ESPACIOS_RE = re.compile(r"\s+")
+
+cache_requests = metrics.counter("llm_cache_requests_total", "Consultas a la caché de respuestas del modelo", ("result",))
+
+
+def _config() -> dict:
+    return {
+        "ttl": float(os.environ.get('_LLM_CACHE_TTL_', 600)),
+        "mode": os.environ.get('_LLM_CACHE_MODE_', 'exact').lower(),
+        "scope": os.environ.get('_LLM_CACHE_SCOPE_', 'user').lower(),
+    }
+
+
+def cache_enabled() -> bool:
+    return _config()["ttl"] > 0
+
+
+def ttl() -> float:
+    return _config()["ttl"]
+
+
+def normalizar_prompt(texto: str, mode: str = "exact") -> str:
+    """exact: solo bordes y Unicode NFC; near: además sin menciones, espacios colapsados y casefold"""
+    texto = unicodedata.normalize("NFC", texto or "").strip()
+    if mode == "near":
+        texto = quitar_menciones(texto)
+        texto = _ESPACIOS_RE.sub(" ", texto).strip().casefold()
+    return texto
+
+
+def clave_cache(payload: Dict[str, Any]) -> str:
+    cfg = _config()
+    alcance = [payload.get("id_project")]
+    if cfg["scope"] == "user":
+        alcance.append(payload.get("id_usuario"))
+    extra = {k: v for k, v in payload.items() if k not in _CAMPOS_ALCANCE}
+    material = json_backend.dumps([
+        cfg["mode"], alcance, normalizar_prompt(payload.get("message", ""), cfg["mode"]),
+        sorted(extra.items()),
+    ])
+    return hashlib.sha256(material).hexdigest()
+
+
+def _init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+    # Leases del single-flight entre workers (ver single_flight.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_inflight (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    # Entrega de la respuesta del líder a los workers que esperan su vuelo,
+    # aparte de la caché de respuestas (ver single_flight.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_handoff (
+            flight TEXT PRIMARY KEY,
+            response TEXT,
+            waiters INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+
+class LLMResponseCache:
+    """TTL + LRU acotado en memoria y en disco"""
+
+    def __init__(self, pool: SQLitePool, mem_size: int, max_rows: int):
+        self.pool = pool
+        self.mem_size = mem_size
+        self.max_rows = max_rows
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+
+    def _mem_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._mem.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            return value
+
+    def _mem_set(self, key: str, value: str, expires: float):
+        with self._lock:
+            self._mem[key] = (expires, value)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_size:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._mem_get(key)
+        if value is not None:
+            return value
+        now = time.time()
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT response, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error("Error leyendo la caché LLM: %s", e)
+            return None
+        self._mem_set(key, row[0], row[1])
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        self._mem_set(key, value, now + ttl)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, now + ttl, now)
+                )
+                self._escrituras += 1
+                if self._escrituras % 100 == 0:
+                    self._desalojar(conn, now)
+        except sqlite3.Error as e:
+            logger.error("Error escribiendo la caché LLM: %s", e)
+
+    def _desalojar(self, conn, now: float):
+        """Borra lo vencido y, si sobra, lo menos usado recientemente"""
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,)
+        )
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._mem)
+
+
+_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = LLMResponseCache(
+            SQLitePool(LLM_CACHE_DB_PATH, size=2, on_init=_init_db),
+            mem_size=int(os.environ.get('_LLM_CACHE_SIZE_', 1000)),
+            max_rows=int(os.environ.get('_LLM_CACHE_MAX_ROWS_', 10000)),
+        )
+    return _cache
+
+
+def buscar(payload: Dict[str, Any]) -> Optional[str]:
+    """Respuesta cacheada para el payload, o None (cuenta hit/miss)"""
+    value = get_llm_cache().get(clave_cache(payload))
+    cache_requests.inc("hit" if value is not None else "miss")
+    return value
+
+
+def guardar(payload: Dict[str, Any], respuesta: str):
+    get_llm_cache().set(clave_cache(payload), respuesta, ttl())
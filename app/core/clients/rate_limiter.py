@@ -0,0 +1,176 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.db.sqlite_pool import SQLitePool
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Limitador por upstream (teamwork, gemini) compartido por todos los workers:
+# token bucket (requests/seg + ráfaga) y tope de llamadas en vuelo, ambos en
+# SQLite. Dentro del proceso los llamadores hacen fila FIFO, así que esperan
+# su turno en orden en lugar de fallar.
+base_dir = Path(__file__).resolve().parent.parent.parent.parent
+RATE_LIMIT_DB_PATH = base_dir / "develop_db" / "rate_limits.db"
+
+# Valores por defecto: Teamwork permite ~150 requests/min por cuenta
+DEFAULTS = {
+    "teamwork": {"rps": 2.5, "burst": 10, "max_inflight": 8},
+    "gemini": {"rps": 5, "burst": 10, "max_inflight": 4},
+}
+
+wait_seconds = metrics.histogram("rate_limit_wait_seconds", "Espera en el limitador antes de llamar al upstream", ("upstream",))
+timeouts = metrics.counter("rate_limit_timeouts_total", "Llamadas que agotaron la espera del limitador", ("upstream",))
+
+
+class LimiteExcedido(Exception):
+    """No se obtuvo turno en el limitador dentro de la espera máxima"""
+
+
+def rate_limit_enabled() -> bool:
+    return os.environ.get('_RATE_LIMIT_ENABLED_', '1').lower() not in ('0', 'false', 'no')
+
+
+def _config(upstream: str) -> dict:
+    base = DEFAULTS.get(upstream, DEFAULTS["gemini"])
+    prefijo = f"_RL_{upstream.upper()}_"
+    return {
+        "rps": float(os.environ.get(prefijo + 'RPS_', base["rps"])),
+        "burst": float(os.environ.get(prefijo + 'BURST_', base["burst"])),
+        "max_inflight": int(os.environ.get(prefijo + 'MAX_INFLIGHT_', base["max_inflight"])),
+        "max_wait": float(os.environ.get('_RL_MAX_WAIT_', 120)),
+        "lease": float(os.environ.get('_RL_SLOT_LEASE_', 300)),
+    }
+
+
+def _init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            upstream TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rate_inflight (
+            slot TEXT PRIMARY KEY,
+            upstream TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_inflight_upstream ON rate_inflight (upstream, expires_at)")
+
+
+_pool: Optional[SQLitePool] = None
+_filas: Dict[str, asyncio.Lock] = {}
+
+
+def _get_pool() -> SQLitePool:
+    global _pool
+    if _pool is None:
+        # Las transacciones duran microsegundos; un busy_timeout corto evita
+        # trabar el event loop si la base queda bloqueada
+        _pool = SQLitePool(RATE_LIMIT_DB_PATH, size=2, timeout=2.0,
+                           pragmas={"busy_timeout": 1000}, on_init=_init_db)
+    return _pool
+
+
+def _intentar(upstream: str, cfg: dict) -> Tuple[Optional[str], float]:
+    """Toma un token y un slot si hay ambos; si no, devuelve cuánto esperar"""
+    now = time.time()
+    with _get_pool().connection() as conn:
+        # Lectura y escritura del bucket en una sola transacción con lock de escritura
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE upstream = ?", (upstream,)).fetchone()
+        tokens = cfg["burst"] if row is None else min(cfg["burst"], row[0] + (now - row[1]) * cfg["rps"])
+
+        conn.execute("DELETE FROM rate_inflight WHERE upstream = ? AND expires_at < ?", (upstream, now))
+        en_vuelo = conn.execute("SELECT COUNT(*) FROM rate_inflight WHERE upstream = ?", (upstream,)).fetchone()[0]
+
+        slot = None
+        if tokens >= 1 and en_vuelo < cfg["max_inflight"]:
+            tokens -= 1
+            slot = uuid.uuid4().hex
+            conn.execute("INSERT INTO rate_inflight (slot, upstream, expires_at) VALUES (?, ?, ?)",
+                         (slot, upstream, now + cfg["lease"]))
+        conn.execute(
+            "INSERT INTO rate_buckets (upstream, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(upstream) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (upstream, tokens, now)
+        )
+
+    if slot is not None:
+        return slot, 0.0
+    if tokens < 1:
+        return None, (1 - tokens) / cfg["rps"]
+    # Hay tokens pero no slots libres: reintentar pronto
+    return None, 0.05
+
+
+def _liberar(slot: str):
+    try:
+        with _get_pool().connection() as conn:
+            conn.execute("DELETE FROM rate_inflight WHERE slot = ?", (slot,))
+    except sqlite3.Error as e:
+        # El slot vence solo al cumplirse el lease
+        logger.error("No se pudo liberar el slot del limitador: %s", e)
+
+
+def penalizar(upstream: str, segundos: float):
+    """El upstream respondió 429: vaciar el bucket para que ningún worker llame durante `segundos`"""
+    if not rate_limit_enabled() or segundos <= 0:
+        return
+    cfg = _config(upstream)
+    try:
+        with _get_pool().connection() as conn:
+            conn.execute(
+                "INSERT INTO rate_buckets (upstream, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(upstream) DO UPDATE SET tokens = MIN(tokens, excluded.tokens), updated_at = excluded.updated_at",
+                (upstream, -segundos * cfg["rps"], time.time())
+            )
+    except sqlite3.Error as e:
+        logger.error("No se pudo penalizar el bucket de %s: %s", upstream, e)
+
+
+@asynccontextmanager
+async def limitar(upstream: str):
+    """async with limitar("teamwork"): ... — espera turno (FIFO) y libera el slot al salir"""
+    if not rate_limit_enabled():
+        yield
+        return
+
+    cfg = _config(upstream)
+    inicio = time.monotonic()
+    fila = _filas.setdefault(upstream, asyncio.Lock())
+    slot = None
+    # asyncio.Lock despierta a los que esperan en orden de llegada: solo la
+    # cabeza de la fila consulta SQLite, el resto espera su turno.
+    async with fila:
+        while True:
+            try:
+                slot, espera = _intentar(upstream, cfg)
+            except sqlite3.Error as e:
+                # Sin coordinación no se bloquea el tráfico: se llama igual
+                logger.error("Limitador de %s no disponible: %s", upstream, e)
+                break
+            if slot is not None:
+                break
+            restante = cfg["max_wait"] - (time.monotonic() - inicio)
+            if restante <= 0:
+                timeouts.inc(upstream)
+                raise LimiteExcedido(f"Sin turno para {upstream} tras {cfg['max_wait']:.0f}s")
+            await asyncio.sleep(min(espera, restante))
+
+    wait_seconds.observe(time.monotonic() - inicio, upstream)
+    try:
+        yield
+    finally:
+        if slot is not None:
+            _liberar(slot)
@@ -0,0 +1,218 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.clients import llm_cache
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Single-flight para prompts idénticos: dentro del proceso los llamadores
+# concurrentes esperan el mismo future; entre workers un lease en SQLite
+# (tabla llm_inflight de llm_cache.db) elige un único líder por vuelo y los
+# demás se anotan en llm_handoff para recibir su respuesta. La entrega es
+# independiente de la caché de respuestas y se borra cuando el último que
+# espera la lee (o al vencer su TTL corto).
+
+_OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+coalesced = metrics.counter("llm_coalesced_total", "Llamadas al modelo resueltas por otro llamador", ("scope",))
+
+
+def coalesce_enabled() -> bool:
+    return os.environ.get('_LLM_COALESCE_', '1').lower() not in ('0', 'false', 'no')
+
+
+def _cross_worker() -> bool:
+    return os.environ.get('_LLM_COALESCE_CROSS_WORKER_', '1').lower() not in ('0', 'false', 'no')
+
+
+def _handoff_ttl() -> float:
+    return float(os.environ.get('_LLM_COALESCE_HANDOFF_TTL_', 30))
+
+
+def _pool():
+    return llm_cache.get_llm_cache().pool
+
+
+def _adquirir(key: str, duracion: float) -> Optional[str]:
+    """Id del vuelo si este llamador queda como líder, None si ya hay otro.
+
+    Un lease vence cuando expires_at <= now (el mismo criterio que _vuelo_vigente).
+    """
+    vuelo = f"{_OWNER}:{uuid.uuid4().hex[:8]}"
+    now = time.time()
+    try:
+        with _pool().connection() as conn:
+            cur = conn.execute(
+                "INSERT INTO llm_inflight (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE llm_inflight.expires_at <= ?",
+                (key, vuelo, now + duracion, now)
+            )
+            return vuelo if cur.rowcount == 1 else None
+    except sqlite3.Error as e:
+        # Sin lease compartido se llama igual: peor caso, una llamada duplicada
+        logger.error("Error tomando el lease de %s: %s", key, e)
+        return vuelo
+
+
+def _liberar(key: str, vuelo: str):
+    try:
+        with _pool().connection() as conn:
+            conn.execute("DELETE FROM llm_inflight WHERE key = ? AND owner = ?", (key, vuelo))
+    except sqlite3.Error as e:
+        logger.error("Error liberando el lease de %s: %s", key, e)
+
+
+def _vuelo_vigente(key: str) -> Optional[str]:
+    try:
+        with _pool().connection() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM llm_inflight WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row is not None and row[1] > time.time() else None
+
+
+def _anotarse(vuelo: str, duracion: float):
+    """Registra a un worker que espera la respuesta del vuelo"""
+    now = time.time()
+    with _pool().connection() as conn:
+        conn.execute("DELETE FROM llm_handoff WHERE expires_at < ?", (now,))
+        conn.execute(
+            "INSERT INTO llm_handoff (flight, response, waiters, expires_at) VALUES (?, NULL, 1, ?) "
+            "ON CONFLICT(flight) DO UPDATE SET waiters = waiters + 1",
+            (vuelo, now + duracion + _handoff_ttl())
+        )
+
+
+def _entregar(vuelo: str, result: str):
+    """El líder deja la respuesta solo si hay workers esperando su vuelo"""
+    try:
+        with _pool().connection() as conn:
+            conn.execute(
+                "UPDATE llm_handoff SET response = ?, expires_at = ? WHERE flight = ?",
+                (result, time.time() + _handoff_ttl(), vuelo)
+            )
+    except sqlite3.Error as e:
+        logger.error("Error entregando la respuesta del vuelo %s: %s", vuelo, e)
+
+
+def _recibir(vuelo: str) -> Optional[str]:
+    try:
+        with _pool().connection() as conn:
+            row = conn.execute("SELECT response FROM llm_handoff WHERE flight = ?", (vuelo,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row is not None else None
+
+
+def _retirarse(vuelo: str):
+    """El worker deja de esperar; el último en irse borra la entrega"""
+    try:
+        with _pool().connection() as conn:
+            conn.execute("UPDATE llm_handoff SET waiters = waiters - 1 WHERE flight = ?", (vuelo,))
+            conn.execute("DELETE FROM llm_handoff WHERE flight = ? AND waiters <= 0", (vuelo,))
+    except sqlite3.Error as e:
+        logger.error("Error liberando la entrega del vuelo %s: %s", vuelo, e)
+
+
+class SingleFlight:
+    """Coalesce llamadas concurrentes con la misma clave en una sola"""
+
+    def __init__(self):
+        self._vuelos: Dict[str, asyncio.Future] = {}
+
+    async def ejecutar(self, key: str, fn: Callable[[], Awaitable[Optional[str]]],
+                       duracion: float, cache_ttl: float = 0) -> Optional[str]:
+        """Ejecuta fn una sola vez por clave; con cache_ttl > 0 la respuesta queda en la caché LLM"""
+        fut = self._vuelos.get(key)
+        if fut is not None:
+            coalesced.inc("process")
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # El líder fue cancelado (no nosotros): se reintenta
+                return await self.ejecutar(key, fn, duracion, cache_ttl)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._vuelos[key] = fut
+        try:
+            result = await self._entre_workers(key, fn, duracion, cache_ttl)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # Evita el aviso de excepción no recuperada si nadie esperaba
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._vuelos.pop(key, None)
+
+    async def _entre_workers(self, key, fn, duracion, cache_ttl) -> Optional[str]:
+        async def lider(vuelo: Optional[str] = None):
+            result = await fn()
+            if result is not None:
+                if vuelo is not None:
+                    _entregar(vuelo, result)
+                if cache_ttl > 0:
+                    llm_cache.get_llm_cache().set(key, result, cache_ttl)
+            return result
+
+        if not _cross_worker():
+            return await lider()
+
+        poll = float(os.environ.get('_LLM_COALESCE_POLL_', 0.2))
+        limite = time.monotonic() + duracion
+        while True:
+            vuelo = _adquirir(key, duracion)
+            if vuelo is not None:
+                try:
+                    return await lider(vuelo)
+                finally:
+                    _liberar(key, vuelo)
+
+            # Otro worker es el líder: esperar la respuesta de su vuelo
+            vuelo = _vuelo_vigente(key)
+            if vuelo is None:
+                # El lease venció entre las dos lecturas o no se pudo leer
+                if time.monotonic() >= limite:
+                    logger.warning("Sin lease vigente para %s tras esperar, se llama directamente", key[:12])
+                    return await lider()
+                await asyncio.sleep(poll)
+                continue
+            try:
+                _anotarse(vuelo, duracion)
+            except sqlite3.Error as e:
+                logger.error("Error esperando el vuelo de %s, se llama directamente: %s", key[:12], e)
+                return await lider()
+            try:
+                while time.monotonic() < limite:
+                    await asyncio.sleep(poll)
+                    result = _recibir(vuelo)
+                    if result is None and _vuelo_vigente(key) != vuelo:
+                        # El líder terminó: la entrega se escribe antes de soltar el lease
+                        result = _recibir(vuelo)
+                        if result is None:
+                            break
+                    if result is not None:
+                        coalesced.inc("worker")
+                        return result
+                else:
+                    logger.warning("Lease de %s vencido sin respuesta, se llama directamente", key[:12])
+                    return await lider()
+            finally:
+                _retirarse(vuelo)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.clients.gemini_client import enviar_accion_stream, RespuestaIncompleta
+from app.core.clients.teamwork_client import publicar_reply, editar_reply
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Respuesta en streaming: el primer fragmento de Gemini se publica como reply
+# apenas llega y los siguientes se aplican editando ese reply, como mucho una
+# edición cada _GEMINI_STREAM_EDIT_INTERVAL_ segundos (la última siempre sale).
+
+AVISO_INTERRUPCION = "\n\n_(respuesta interrumpida)_"
+
+edits = metrics.counter("stream_reply_updates_total", "Publicaciones y ediciones de replies en streaming", ("kind",))
+
+
+def _intervalo() -> float:
+    return float(os.environ.get('_GEMINI_STREAM_EDIT_INTERVAL_', 3))
+
+
+class _ReplyProgresivo:
+    """Mantiene el reply de Teamwork al día con el último texto recibido"""
+
+    def __init__(self, message_id, intervalo: float):
+        self.message_id = message_id
+        self.intervalo = intervalo
+        self.texto = ""
+        self.publicado = ""
+        self.reply_id: Optional[str] = None
+        self.fin = False
+        self._hay_texto = asyncio.Event()
+
+    def actualizar(self, texto: str):
+        # Llamado por el stream en cada fragmento: solo anota, no hace I/O
+        self.texto = texto
+        self._hay_texto.set()
+
+    def terminar(self, texto: Optional[str] = None):
+        if texto is not None:
+            self.texto = texto
+        self.fin = True
+        self._hay_texto.set()
+
+    async def correr(self):
+        ultimo = float("-inf")
+        while True:
+            await self._hay_texto.wait()
+            # El primer reply sale de inmediato; las ediciones (y los reintentos
+            # de publicación) se agrupan en una por intervalo
+            espera = ultimo + self.intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._hay_texto.clear()
+            await self._sincronizar()
+            ultimo = time.monotonic()
+            if self.fin and not self._hay_texto.is_set():
+                return
+
+    async def _sincronizar(self):
+        texto = self.texto
+        if not texto or texto == self.publicado:
+            return
+        if self.reply_id is None:
+            self.reply_id = await publicar_reply(self.message_id, texto)
+            if self.reply_id is not None:
+                self.publicado = texto
+                edits.inc("post")
+            return
+        if not self.reply_id:
+            # Teamwork no devolvió el id: no hay forma de editar el reply
+            return
+        if await editar_reply(self.reply_id, texto):
+            self.publicado = texto
+            edits.inc("edit")
+
+
+async def responder_en_streaming(message_id, payload: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+    """Pide la respuesta en streaming y la va publicando en el mensaje.
+
+    Devuelve (texto del modelo, si se publicó algo). Si Gemini no responde
+    propaga GeminiNoDisponible, como en el modo sin streaming.
+    """
+    reply = _ReplyProgresivo(message_id, _intervalo())
+    editor = asyncio.create_task(reply.correr())
+    texto = None
+    try:
+        texto = await enviar_accion_stream(payload, reply.actualizar)
+    except RespuestaIncompleta as e:
+        logger.warning("Respuesta del mensaje %s cortada (%s); se publica lo recibido", message_id, e)
+        reply.texto = e.parcial + AVISO_INTERRUPCION
+    finally:
+        # El editor publica el último texto antes de terminar
+        reply.terminar(texto)
+        await editor
+
+    if reply.reply_id is not None and not reply.reply_id:
+        logger.warning("Teamwork no devolvió el id del reply del mensaje %s; no se pudo editar", message_id)
+    return texto, reply.reply_id is not None
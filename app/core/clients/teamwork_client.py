@@ -0,0 +1,230 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import httpx
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from app.core.clients.http_client import get_http_client
+from app.utilities import json_backend
+from app.core.observability import metrics
+from app.core.clients.rate_limiter import limitar, penalizar, LimiteExcedido
+
+logger = logging.getLogger(__name__)
+
+# Cliente único para la API de Teamwork: URL base y auth compartidas, pool
+# keep-alive del cliente HTTP del proceso y reintentos ante 429/5xx.
+
+IDEMPOTENTES = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+# Errores en los que la petición no llegó al servidor: siempre se puede reintentar
+ERRORES_SIN_ENVIO = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+retries = metrics.counter("teamwork_retries_total", "Reintentos de llamadas a Teamwork", ("reason",))
+
+
+def _retry_config() -> dict:
+    return {
+        "attempts": int(os.environ.get('_TW_RETRY_ATTEMPTS_', 3)),
+        "backoff": float(os.environ.get('_TW_RETRY_BACKOFF_', 0.5)),
+        "max_wait": float(os.environ.get('_TW_RETRY_MAX_WAIT_', 30)),
+    }
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """Segundos indicados en Retry-After (delta o fecha HTTP)"""
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _reintentable(method: str, status: int) -> bool:
+    # 429 y 503 indican que la petición no se procesó; el resto de 5xx solo
+    # se reintenta en métodos idempotentes para no duplicar replies
+    if status in (429, 503):
+        return True
+    return status >= 500 and method in IDEMPOTENTES
+
+
+class TeamworkClient:
+    """Llamadas a Teamwork con auth compartida, reintentos y estadísticas de reuso"""
+
+    def __init__(self, base_url: str, auth: Tuple[str, str]):
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self._stats = {"requests": 0, "new_connections": 0, "handshake_seconds": 0.0, "retries": 0}
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+    def _trace(self):
+        """Callback de httpcore: cuenta conexiones nuevas y el tiempo de handshake TCP+TLS"""
+        inicio = {}
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.started":
+                inicio["t"] = time.perf_counter()
+                self._stats["new_connections"] += 1
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and "t" in inicio:
+                # Con TLS el segundo evento extiende la medición hasta el fin del handshake
+                ahora = time.perf_counter()
+                self._stats["handshake_seconds"] += ahora - inicio["t"]
+                inicio["t"] = ahora
+        return trace
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Petición con reintentos ante 429/5xx (respetando Retry-After) y errores de conexión"""
+        method = method.upper()
+        cfg = _retry_config()
+        kwargs.setdefault("auth", self.auth)
+        url = self._url(path)
+
+        for intento in range(1, cfg["attempts"] + 1):
+            self._stats["requests"] += 1
+            inicio = time.perf_counter()
+            try:
+                # El turno del limitador se toma por intento y se suelta antes de esperar el reintento
+                async with limitar("teamwork"):
+                    inicio = time.perf_counter()
+                    resp = await get_http_client().request(method, url, extensions={"trace": self._trace()}, **kwargs)
+            except httpx.HTTPError as e:
+                metrics.llamada_saliente("teamwork", "timeout" if isinstance(e, httpx.TimeoutException) else "error",
+                                         time.perf_counter() - inicio)
+                puede = isinstance(e, ERRORES_SIN_ENVIO) or (method in IDEMPOTENTES and isinstance(e, httpx.TransportError))
+                if not puede or intento == cfg["attempts"]:
+                    raise
+                espera, motivo = None, type(e).__name__
+            else:
+                metrics.llamada_saliente("teamwork", "ok" if resp.status_code < 400 else f"http_{resp.status_code}",
+                                         time.perf_counter() - inicio)
+                if not _reintentable(method, resp.status_code) or intento == cfg["attempts"]:
+                    return resp
+                espera, motivo = _retry_after(resp), str(resp.status_code)
+                if espera is not None and espera > cfg["max_wait"]:
+                    logger.warning("Teamwork pide esperar %.0fs (> %.0fs), no se reintenta", espera, cfg['max_wait'])
+                    return resp
+
+            if espera is None:
+                espera = min(cfg["max_wait"], cfg["backoff"] * 2 ** (intento - 1)) * random.uniform(0.5, 1.0)
+            if motivo == "429":
+                # Frena también a los demás workers, no solo a este reintento
+                penalizar("teamwork", espera)
+            self._stats["retries"] += 1
+            retries.inc(motivo)
+            logger.info("Reintentando %s %s en %.2fs (%s, intento %s)", method, path, espera, motivo, intento)
+            await asyncio.sleep(espera)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post_json(self, path: str, payload, **kwargs) -> httpx.Response:
+        headers = {"Content-Type": "application/json", **kwargs.pop("headers", {})}
+        return await self.request("POST", path, content=json_backend.dumps(payload), headers=headers, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs):
+        """Respuesta en streaming (descargas); sin reintentos porque el cuerpo se consume una sola vez"""
+        kwargs.setdefault("auth", self.auth)
+        self._stats["requests"] += 1
+        # El slot en vuelo se mantiene mientras se consume el cuerpo
+        async with limitar("teamwork"):
+            async with get_http_client().stream(method.upper(), self._url(path),
+                                                extensions={"trace": self._trace()}, **kwargs) as resp:
+                yield resp
+
+    def stats(self) -> dict:
+        return _con_derivadas(dict(self._stats))
+
+
+def _con_derivadas(s: dict) -> dict:
+    nuevas, total = s["new_connections"], s["requests"]
+    s["reuse_ratio"] = 1 - nuevas / total if total else 0.0
+    # Estimación: cada request que reusó conexión se ahorró un handshake promedio
+    s["handshake_saved_seconds"] = s["handshake_seconds"] / nuevas * (total - nuevas) if nuevas else 0.0
+    return s
+
+
+_clients: Dict[str, TeamworkClient] = {}
+
+
+def get_teamwork_client(perfil: str = "bot") -> TeamworkClient:
+    """Cliente compartido por perfil de credenciales.
+
+    - bot: _URL_TEAMWORK_ con la key del bot (replies)
+    - api: TEAMWORK_BASE_URL con TEAMWORK_API_KEY (tareas y archivos)
+    """
+    if perfil not in _clients:
+        if perfil == "bot":
+            _clients[perfil] = TeamworkClient(str(os.environ.get('_URL_TEAMWORK_')), (str(os.environ.get('_KEY_BOT_')), ''))
+        elif perfil == "api":
+            _clients[perfil] = TeamworkClient(str(os.getenv('TEAMWORK_BASE_URL')), (os.getenv("TEAMWORK_API_KEY"), "x"))
+        else:
+            raise ValueError(f"Perfil de Teamwork desconocido: {perfil}")
+    return _clients[perfil]
+
+
+def teamwork_stats() -> dict:
+    """Estadísticas agregadas de todos los perfiles (para /metrics)"""
+    total = {"requests": 0, "new_connections": 0, "handshake_seconds": 0.0, "retries": 0}
+    for client in _clients.values():
+        for k, v in client._stats.items():
+            total[k] += v
+    return _con_derivadas(total)
+
+
+async def publicar_reply(message_id, body: str, timeout: float = 15.0) -> Optional[str]:
+    """Publica un reply en el mensaje y devuelve su id (None si Teamwork no lo aceptó)"""
+    payload = {
+        "messagereply": {
+            "body": body,
+            "notify": ""
+        }
+    }
+    try:
+        resp = await get_teamwork_client("bot").post_json(
+            f"/messages/{message_id}/messageReplies.json", payload, timeout=timeout
+        )
+    except (httpx.HTTPError, LimiteExcedido) as e:
+        logger.error("Error respondiendo mensaje %s: %s", message_id, e)
+        return None
+
+    logger.info(resp.text)
+    if resp.status_code != 201:
+        return None
+    try:
+        return str(json_backend.loads(resp.content).get("id", ""))
+    except (json_backend.JSONDecodeError, AttributeError):
+        return ""
+
+
+async def editar_reply(reply_id: str, body: str, timeout: float = 15.0) -> bool:
+    """Reemplaza el cuerpo de un reply ya publicado (PUT, se puede reintentar)"""
+    payload = {
+        "messagereply": {
+            "body": body
+        }
+    }
+    try:
+        resp = await get_teamwork_client("bot").request(
+            "PUT", f"/messageReplies/{reply_id}.json", content=json_backend.dumps(payload),
+            headers={"Content-Type": "application/json"}, timeout=timeout
+        )
+    except (httpx.HTTPError, LimiteExcedido) as e:
+        logger.error("Error editando el reply %s: %s", reply_id, e)
+        return False
+    return resp.status_code < 300
+
+
+async def responder_mensaje(message_id, body: str, timeout: float = 15.0) -> bool:
+    """Publica la respuesta del modelo como reply del mensaje en Teamwork"""
+    return await publicar_reply(message_id, body, timeout) is not None
@@ -0,0 +1,345 @@
+import os
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from app.db.database import SessionLocal, async_db_enabled, get_async_sessionmaker
+from app.db.sqlite_pool import SQLitePool
+from app.models.database.message import Message, MessageReplay, Tasks
+from app.utilities import json_backend
+from app.core.clients.teamwork_client import get_teamwork_client
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Contexto de hilo para el modelo: por cada mensaje (teamwork_id) se guardan
+# los últimos turnos de la conversación en una tabla SQLite compartida por los
+# workers. Se actualiza en cada insert (persistence.guardar), así que armar el
+# prompt es una sola lectura por clave en vez de recorrer el hilo completo.
+base_dir = Path(__file__).resolve().parent.parent.parent.parent
+THREAD_CONTEXT_DB_PATH = base_dir / "develop_db" / "thread_context.db"
+
+BOT_AUTOR = "Profesor Forta"
+
+context_requests = metrics.counter("thread_context_requests_total", "Lecturas del contexto de hilo", ("result",))
+
+
+class ContextoHilo(NamedTuple):
+    project_id: Optional[int]
+    texto: str
+
+
+def _config() -> dict:
+    return {
+        "turns": int(os.environ.get('_THREAD_CONTEXT_TURNS_', 20)),
+        "tokens": int(os.environ.get('_THREAD_CONTEXT_TOKENS_', 1500)),
+        "ttl": float(os.environ.get('_THREAD_CONTEXT_TTL_', 30 * 24 * 3600)),
+    }
+
+
+def context_enabled() -> bool:
+    return _config()["tokens"] > 0
+
+
+def proyecto_por_defecto() -> int:
+    """Proyecto para los hilos cuyo proyecto no se conoce (no se guardó el mensaje raíz)"""
+    return int(os.environ.get('_DEFAULT_PROJECT_ID_', 506482))
+
+
+def _init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thread_context (
+            teamwork_id INTEGER PRIMARY KEY,
+            project_id INTEGER,
+            turns TEXT NOT NULL,
+            parcial INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_thread_context_updated ON thread_context (updated_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS project_names (
+            project_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+
+_pool: Optional[SQLitePool] = None
+_ultima_purga = 0.0
+
+
+def _get_pool() -> SQLitePool:
+    global _pool
+    if _pool is None:
+        _pool = SQLitePool(THREAD_CONTEXT_DB_PATH, size=2, on_init=_init_db)
+    return _pool
+
+
+def estimar_tokens(texto: str) -> int:
+    """Aproximación de ~4 caracteres por token (sin depender de un tokenizer)"""
+    return len(texto) // 4 + 1
+
+
+def _turno(turn_id: str, autor: str, texto: str, ts) -> dict:
+    # Un turno nunca ocupa más que el presupuesto completo
+    limite = _config()["tokens"] * 4
+    return {"id": turn_id, "autor": autor or "", "texto": (texto or "")[:limite], "ts": str(ts or "")}
+
+
+def _turno_de_fila(row) -> Optional[tuple]:
+    """(teamwork_id, project_id, turno) para las filas que forman parte de un hilo"""
+    if isinstance(row, Message):
+        return row.teamwork_id, row.project_id, _turno(f"m:{row.teamwork_id}", row.author_name,
+                                                       row.message_content, row.created_at)
+    if isinstance(row, MessageReplay):
+        return row.teamwork_id, None, _turno(f"r:{row.post_id}", row.author_name, row.post_body, row.created_at)
+    return None
+
+
+def _fusionar(turnos: List[dict], nuevos: Iterable[dict], maximo: int) -> List[dict]:
+    """Agrega sin duplicar (por id), ordena por fecha y se queda con los últimos"""
+    por_id = {t["id"]: t for t in turnos}
+    for t in nuevos:
+        por_id[t["id"]] = t
+    return sorted(por_id.values(), key=lambda t: t["ts"])[-maximo:]
+
+
+def _agregar_turnos(teamwork_id: int, project_id: Optional[int], nuevos: List[dict], parcial_si_nuevo: bool):
+    global _ultima_purga
+    cfg = _config()
+    now = time.time()
+    with _get_pool().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT project_id, turns, parcial FROM thread_context WHERE teamwork_id = ?",
+                           (teamwork_id,)).fetchone()
+        if row is None:
+            # Un reply de un hilo sin caché: faltan los turnos anteriores, se
+            # completan desde la base la primera vez que se arma el contexto
+            turnos, parcial = [], int(parcial_si_nuevo)
+        else:
+            project_id = project_id if project_id is not None else row[0]
+            turnos, parcial = json_backend.loads(row[1]), row[2]
+        turnos = _fusionar(turnos, nuevos, cfg["turns"])
+        conn.execute(
+            "INSERT OR REPLACE INTO thread_context (teamwork_id, project_id, turns, parcial, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (teamwork_id, project_id, json_backend.dumps_str(turnos), parcial, now)
+        )
+        if now - _ultima_purga > 3600:
+            _ultima_purga = now
+            conn.execute("DELETE FROM thread_context WHERE updated_at < ?", (now - cfg["ttl"],))
+
+
+def turnos_por_hilo(rows: Iterable) -> Dict[int, list]:
+    """{teamwork_id: [project_id, turnos, es_reply]} de las filas de mensajes.
+
+    Se llama antes de guardar: tras el commit la sesión expira los atributos de las filas.
+    """
+    por_hilo: Dict[int, list] = {}
+    if not context_enabled():
+        return por_hilo
+    for row in rows:
+        item = _turno_de_fila(row)
+        if item is None or item[0] is None:
+            continue
+        teamwork_id, project_id, turno = item
+        hilo = por_hilo.setdefault(teamwork_id, [project_id, [], isinstance(row, MessageReplay)])
+        if project_id is not None:
+            hilo[0] = project_id
+        hilo[1].append(turno)
+    return por_hilo
+
+
+def _registrar_sync(por_hilo: Dict[int, list]):
+    for teamwork_id, (project_id, turnos, es_reply) in por_hilo.items():
+        try:
+            _agregar_turnos(teamwork_id, project_id, turnos, parcial_si_nuevo=es_reply)
+        except sqlite3.Error as e:
+            # El contexto es auxiliar: un error aquí no debe frenar el guardado
+            logger.error("No se pudo actualizar el contexto del hilo %s: %s", teamwork_id, e)
+
+
+async def registrar(por_hilo: Dict[int, list]):
+    """Agrega al contexto de cada hilo los turnos recién guardados"""
+    if por_hilo:
+        await run_in_threadpool(_registrar_sync, por_hilo)
+
+
+def _registrar_respuesta_sync(teamwork_id: int, turno: dict):
+    try:
+        _agregar_turnos(teamwork_id, None, [turno], parcial_si_nuevo=True)
+    except sqlite3.Error as e:
+        logger.error("No se pudo registrar la respuesta en el hilo %s: %s", teamwork_id, e)
+
+
+async def registrar_respuesta(teamwork_id: int, texto: str):
+    """Agrega la respuesta del bot como turno del hilo"""
+    if not context_enabled() or not texto:
+        return
+    turno = _turno(f"b:{time.time_ns()}", BOT_AUTOR, texto, _ahora_iso())
+    await run_in_threadpool(_registrar_respuesta_sync, teamwork_id, turno)
+
+
+def _ahora_iso() -> str:
+    # Mismo formato que str(datetime) de las filas (UTC, como las fechas de Teamwork)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+def _consultas_hilo(teamwork_id: int, limite: int) -> tuple:
+    raiz = select(Message).where(Message.teamwork_id == teamwork_id).limit(1)
+    replies = (select(MessageReplay)
+               .where(MessageReplay.teamwork_id == teamwork_id)
+               .order_by(MessageReplay.created_at.desc())
+               .limit(limite))
+    return raiz, replies
+
+
+def _turnos_reconstruidos(raiz, replies) -> tuple:
+    turnos = [_turno_de_fila(r)[2] for r in ([raiz] if raiz else []) + list(replies)]
+    return (raiz.project_id if raiz else None), turnos
+
+
+def _reconstruir_sync(teamwork_id: int, limite: int) -> tuple:
+    q_raiz, q_replies = _consultas_hilo(teamwork_id, limite)
+    db = SessionLocal()
+    try:
+        raiz = db.execute(q_raiz).scalars().first()
+        replies = db.execute(q_replies).scalars().all()
+    finally:
+        db.close()
+    return _turnos_reconstruidos(raiz, replies)
+
+
+async def _reconstruir(teamwork_id: int, limite: int) -> tuple:
+    """Últimos turnos del hilo desde la base principal (solo para hilos sin caché).
+
+    Lee del mismo motor en el que escribe persistence.guardar_directo.
+    """
+    if not async_db_enabled():
+        return await run_in_threadpool(_reconstruir_sync, teamwork_id, limite)
+    q_raiz, q_replies = _consultas_hilo(teamwork_id, limite)
+    async with get_async_sessionmaker()() as db:
+        raiz = (await db.execute(q_raiz)).scalars().first()
+        replies = (await db.execute(q_replies)).scalars().all()
+    return _turnos_reconstruidos(raiz, replies)
+
+
+def _formatear(turnos: List[dict], presupuesto: int) -> str:
+    """Turnos más recientes primero hasta agotar el presupuesto de tokens, en orden cronológico"""
+    lineas = []
+    usados = 0
+    for t in reversed(turnos):
+        linea = f"{t['autor']}: {t['texto']}"
+        costo = estimar_tokens(linea)
+        if usados + costo > presupuesto:
+            if not lineas:
+                # Ni el turno más reciente entra completo: se corta
+                lineas.append(linea[:presupuesto * 4].rstrip() + "…")
+            break
+        lineas.append(linea)
+        usados += costo
+    return "\n".join(reversed(lineas))
+
+
+async def contexto_hilo(teamwork_id: int, excluir: Optional[str] = None) -> ContextoHilo:
+    """Proyecto y turnos recientes del hilo, recortados al presupuesto de tokens.
+
+    excluir es el id del turno actual (p.ej. "r:<post_id>"), que va aparte en el mensaje.
+    """
+    cfg = _config()
+    if not context_enabled():
+        return ContextoHilo(None, "")
+    try:
+        with _get_pool().connection() as conn:
+            row = conn.execute("SELECT project_id, turns, parcial FROM thread_context WHERE teamwork_id = ?",
+                               (teamwork_id,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error("Error leyendo el contexto del hilo %s: %s", teamwork_id, e)
+        context_requests.inc("error")
+        return ContextoHilo(None, "")
+
+    if row is not None and not row[2]:
+        context_requests.inc("hit")
+        project_id, turnos = row[0], json_backend.loads(row[1])
+    else:
+        # Hilo sin caché o incompleto: una sola reconstrucción, luego queda al día con cada insert
+        context_requests.inc("rebuild")
+        project_id, turnos = await _reconstruir(teamwork_id, cfg["turns"])
+        if row is not None:
+            project_id = project_id if project_id is not None else row[0]
+            turnos = _fusionar(turnos, json_backend.loads(row[1]), cfg["turns"])
+        try:
+            with _get_pool().connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO thread_context (teamwork_id, project_id, turns, parcial, updated_at) "
+                    "VALUES (?, ?, ?, 0, ?)",
+                    (teamwork_id, project_id, json_backend.dumps_str(turnos), time.time())
+                )
+        except sqlite3.Error as e:
+            logger.error("No se pudo guardar el contexto del hilo %s: %s", teamwork_id, e)
+
+    turnos = [t for t in turnos if t["id"] != excluir]
+    return ContextoHilo(project_id, _formatear(turnos, cfg["tokens"]))
+
+
+def _consulta_nombre(project_id: int):
+    return (select(Tasks.project_name)
+            .where(Tasks.id_project == project_id, Tasks.project_name.isnot(None))
+            .limit(1))
+
+
+def _nombre_proyecto_sync(project_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        return db.execute(_consulta_nombre(project_id)).scalar()
+    finally:
+        db.close()
+
+
+async def _nombre_proyecto_guardado(project_id: int) -> Optional[str]:
+    """Nombre del proyecto en las tareas guardadas, del mismo motor en el que escribe guardar_directo"""
+    if not async_db_enabled():
+        return await run_in_threadpool(_nombre_proyecto_sync, project_id)
+    async with get_async_sessionmaker()() as db:
+        return (await db.execute(_consulta_nombre(project_id))).scalar()
+
+
+async def nombre_proyecto(project_id: Optional[int]) -> str:
+    """Nombre del proyecto: caché local, luego las tareas guardadas y por último la API de Teamwork"""
+    if project_id is None:
+        return ""
+    try:
+        with _get_pool().connection() as conn:
+            row = conn.execute("SELECT name FROM project_names WHERE project_id = ?", (project_id,)).fetchone()
+        if row is not None:
+            return row[0]
+    except sqlite3.Error as e:
+        logger.error("Error leyendo el nombre del proyecto %s: %s", project_id, e)
+
+    nombre = await _nombre_proyecto_guardado(project_id)
+    if nombre is None:
+        try:
+            resp = await get_teamwork_client("api").get(f"/projects/api/v3/projects/{project_id}.json", timeout=10.0)
+            if resp.status_code == 200:
+                nombre = json_backend.loads(resp.content).get("project", {}).get("name")
+        except Exception as e:
+            logger.error("No se pudo obtener el nombre del proyecto %s: %s", project_id, e)
+    if not nombre:
+        if project_id == proyecto_por_defecto():
+            return os.environ.get('_DEFAULT_PROJECT_NAME_', 'TI TEAM')
+        return ""
+
+    try:
+        with _get_pool().connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO project_names (project_id, name, updated_at) VALUES (?, ?, ?)",
+                         (project_id, nombre, time.time()))
+    except sqlite3.Error as e:
+        logger.error("No se pudo guardar el nombre del proyecto %s: %s", project_id, e)
+    return nombre
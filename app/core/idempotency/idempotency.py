@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.db.sqlite_pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+# Deduplicación de webhooks reenviados por Teamwork. La clave es
+# evento + id del objeto + versión: dateUpdated en los eventos de
+# actualización (una edición real genera otra clave y se procesa) y
+# dateCreated en los de creación, que no cambia aunque el objeto se edite
+# entre un envío y su reenvío.
+base_dir = Path(__file__).resolve().parent.parent.parent.parent
+IDEMPOTENCY_DB_PATH = base_dir / "develop_db" / "idempotency.db"
+
+PROCESANDO = "processing"
+HECHO = "done"
+
+
+def idempotency_enabled() -> bool:
+    return os.environ.get('_IDEMPOTENCY_ENABLED_', '1').lower() not in ('0', 'false', 'no')
+
+
+def _init_db(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_seen (
+            key TEXT PRIMARY KEY,
+            estado TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_webhook_seen_updated ON webhook_seen (updated_at)")
+
+
+class IdempotencyStore:
+    """LRU en memoria delante de una tabla SQLite compartida entre workers.
+
+    El LRU responde los duplicados del mismo proceso sin tocar disco; la tabla
+    cubre los reenvíos que caen en otro worker o tras un reinicio.
+    """
+
+    def __init__(self, pool: SQLitePool, lru_size: int, ttl: float, lease: float):
+        self.pool = pool
+        self.lru_size = lru_size
+        self.ttl = ttl
+        self.lease = lease
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self._ultima_purga = 0.0
+        self.stats = {"claimed": 0, "lru_hits": 0, "db_hits": 0, "released": 0}
+
+    def _recordar(self, key: str):
+        with self._lock:
+            self._vistos[key] = True
+            self._vistos.move_to_end(key)
+            while len(self._vistos) > self.lru_size:
+                self._vistos.popitem(last=False)
+
+    def reclamar(self, key: str) -> bool:
+        """True si el evento es nuevo y este proceso debe ejecutarlo"""
+        with self._lock:
+            if key in self._vistos:
+                self._vistos.move_to_end(key)
+                self.stats["lru_hits"] += 1
+                return False
+
+        now = time.time()
+        hecho = False
+        with self.pool.connection() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO webhook_seen (key, estado, updated_at) VALUES (?, ?, ?)",
+                (key, PROCESANDO, now)
+            )
+            if cur.rowcount == 0:
+                # Un "processing" vencido es de un worker que murió: se retoma
+                cur = conn.execute(
+                    "UPDATE webhook_seen SET updated_at = ? WHERE key = ? AND estado = ? AND updated_at < ?",
+                    (now, key, PROCESANDO, now - self.lease)
+                )
+            nuevo = cur.rowcount == 1
+            if not nuevo:
+                row = conn.execute("SELECT estado FROM webhook_seen WHERE key = ?", (key,)).fetchone()
+                hecho = row is not None and row[0] == HECHO
+            if now - self._ultima_purga > 3600:
+                self._ultima_purga = now
+                conn.execute("DELETE FROM webhook_seen WHERE updated_at < ?", (now - self.ttl,))
+
+        # Solo lo terminado entra al LRU: un "processing" de otro worker puede
+        # liberarse si falla, y el reenvío tiene que volver a consultar la tabla
+        if hecho:
+            self._recordar(key)
+        if nuevo:
+            self.stats["claimed"] += 1
+        else:
+            self.stats["db_hits"] += 1
+        return nuevo
+
+    def completar(self, key: str):
+        with self.pool.connection() as conn:
+            conn.execute("UPDATE webhook_seen SET estado = ?, updated_at = ? WHERE key = ?",
+                         (HECHO, time.time(), key))
+        self._recordar(key)
+
+    def liberar(self, key: str):
+        """El procesamiento falló: se borra la clave para que el reenvío se reintente"""
+        with self._lock:
+            self._vistos.pop(key, None)
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM webhook_seen WHERE key = ?", (key,))
+        self.stats["released"] += 1
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        pool = SQLitePool(IDEMPOTENCY_DB_PATH, size=2, on_init=_init_db)
+        _store = IdempotencyStore(
+            pool,
+            lru_size=int(os.environ.get('_IDEMPOTENCY_LRU_SIZE_', 10000)),
+            ttl=float(os.environ.get('_IDEMPOTENCY_TTL_', 7 * 24 * 3600)),
+            lease=float(os.environ.get('_IDEMPOTENCY_LEASE_', 300)),
+        )
+    return _store
+
+
+def clave_evento(event: str, object_id, version) -> Optional[str]:
+    """event:id:versión; None si falta el id o la versión (no se deduplica)"""
+    if object_id is None or version is None:
+        return None
+    if isinstance(version, datetime):
+        version = version.isoformat()
+    return f"{event}:{object_id}:{version}"
+
+
+def idempotente(event: str, clave: Callable):
+    """Decorador para los procesar_*: ignora el evento si su clave ya se procesó.
+
+    clave(payload) devuelve (id, versión). Si el handler
+    lanza una excepción la clave se libera para que un reenvío lo reintente.
+    """
+    def decorador(fn):
+        @wraps(fn)
+        async def wrapper(payload, *args, **kwargs):
+            key = clave_evento(event, *clave(payload)) if idempotency_enabled() else None
+            if key is None:
+                return await fn(payload, *args, **kwargs)
+
+            store = get_store()
+            if not store.reclamar(key):
+                logger.info("Evento duplicado ignorado: %s", key)
+                return {
+                    "status": "duplicate",
+                    "reason": "evento ya procesado"
+                }
+            try:
+                respuesta = await fn(payload, *args, **kwargs)
+            except BaseException:
+                store.liberar(key)
+                raise
+            store.completar(key)
+            return respuesta
+        return wrapper
+    return decorador
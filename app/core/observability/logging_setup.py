@@ -0,0 +1,168 @@
+import os
+import sys
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utilities import json_backend
+
+# Logging estructurado y no bloqueante: los handlers de la app solo encolan
+# el LogRecord; un hilo (QueueListener) lo formatea y escribe en stdout, así
+# el event loop nunca espera a una escritura de consola.
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Atributos estándar de LogRecord; el resto (extra=...) se emite como campos
+_RESERVADOS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra= incluidos"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVADOS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        try:
+            return json_backend.dumps_str(data)
+        except TypeError:
+            return json_backend.dumps_str({k: str(v) for k, v in data.items()})
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que loguea y descarta si la cola está llena"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El mensaje se arma en el listener (formateo diferido); solo la
+        # traza se resuelve aquí porque el frame puede cambiar después.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configurar_logging():
+    """Instala el handler en cola sobre el logger raíz (idempotente)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.environ.get('_LOG_FORMAT_', 'text').lower() == 'json':
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('_LOG_QUEUE_SIZE_', 10000)))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(os.environ.get('_LOG_LEVEL_', 'INFO').upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+
+
+def detener_logging():
+    """Vacía la cola y detiene el hilo escritor"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def registros_descartados() -> int:
+    return sum(getattr(h, "dropped", 0) for h in logging.getLogger().handlers)
+
+
+# ---------------------------------------------------------------------------
+# Payloads: muestreo por ruta y truncado
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=8)
+def _parse_rutas(raw: str) -> Dict[str, float]:
+    """"message.create=1,comment.create=0.1" -> {"message.create": 1.0, ...}"""
+    rates = {}
+    for item in raw.split(","):
+        ruta, _, rate = item.partition("=")
+        if ruta.strip() and rate.strip():
+            try:
+                rates[ruta.strip()] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+def _config_payload(ruta: str) -> Tuple[float, int]:
+    rates = _parse_rutas(os.environ.get('_LOG_PAYLOAD_SAMPLE_ROUTES_', ''))
+    rate = rates.get(ruta, float(os.environ.get('_LOG_PAYLOAD_SAMPLE_', 0)))
+    return rate, int(os.environ.get('_LOG_PAYLOAD_MAX_CHARS_', 2048))
+
+
+class _PayloadTruncado:
+    """Serializa y recorta el payload solo cuando el listener formatea el registro"""
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload: Any, max_chars: int):
+        self.payload = payload
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, BaseModel):
+            text = self.payload.model_dump_json()
+        elif isinstance(self.payload, (bytes, bytearray)):
+            text = bytes(self.payload).decode("utf-8", "replace")
+        else:
+            try:
+                text = json_backend.dumps_str(self.payload)
+            except TypeError:
+                text = str(self.payload)
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}…(+{len(text) - self.max_chars} chars)"
+        return text
+
+
+def log_payload(logger: logging.Logger, ruta: str, payload: Any):
+    """Loguea el payload de un webhook según el muestreo configurado para la ruta.
+
+    _LOG_PAYLOAD_SAMPLE_ es la fracción por defecto (0 = nunca, 1 = siempre) y
+    _LOG_PAYLOAD_SAMPLE_ROUTES_ la sobreescribe por ruta.
+    """
+    rate, max_chars = _config_payload(ruta)
+    if rate <= 0 or not logger.isEnabledFor(logging.INFO):
+        return
+    if rate < 1 and random.random() >= rate:
+        return
+    logger.info("Payload %s: %s", ruta, _PayloadTruncado(payload, max_chars),
+                extra={"route": ruta})
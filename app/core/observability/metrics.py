@@ -0,0 +1,200 @@
+import time
+import threading
+from functools import wraps
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Métricas en memoria con exposición en formato de texto de Prometheus.
+# Cada worker de uvicorn tiene su propio registro; /metrics devuelve el del
+# proceso que atiende el scrape.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_metricas: Dict[str, "_Metrica"] = {}
+_gauges: List[Tuple[str, str, Optional[str], Callable]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    partes = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def exponer(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._valores: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self._valores[labels] = self._valores.get(labels, 0) + amount
+
+    def exponer(self) -> List[str]:
+        with _lock:
+            items = list(self._valores.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [conteo por bucket..., +Inf, suma]
+        self._valores: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            fila = self._valores.get(labels)
+            if fila is None:
+                fila = self._valores[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            fila[i] += 1
+            fila[-1] += value
+
+    def time(self, *labels) -> "Cronometro":
+        return Cronometro(self, labels)
+
+    def exponer(self) -> List[str]:
+        with _lock:
+            items = [(k, list(v)) for k, v in self._valores.items()]
+        lineas = []
+        for labels, fila in items:
+            acumulado = 0
+            for limite, n in zip(self.buckets + ("+Inf",), fila):
+                acumulado += n
+                le = f'le="{limite}"'
+                lineas.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acumulado}")
+            lineas.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {fila[-1]}")
+            lineas.append(f"{self.name}_count{_labels(self.labelnames, labels)} {acumulado}")
+        return lineas
+
+
+class Cronometro:
+    """Context manager que observa la duración del bloque en el histograma"""
+
+    __slots__ = ("hist", "labels", "inicio")
+
+    def __init__(self, hist: Histogram, labels: tuple):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.inicio, *self.labels)
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    with _lock:
+        if name not in _metricas:
+            _metricas[name] = Counter(name, help, labelnames)
+        return _metricas[name]
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    with _lock:
+        if name not in _metricas:
+            _metricas[name] = Histogram(name, help, labelnames, buckets)
+        return _metricas[name]
+
+
+def gauge_fn(name: str, help: str, fn: Callable, labelname: Optional[str] = None):
+    """Gauge calculado al momento del scrape.
+
+    fn devuelve un número, o un dict {valor_de_label: número} si se indica labelname.
+    """
+    _gauges.append((name, help, labelname, fn))
+
+
+def exponer() -> str:
+    """Todas las métricas del proceso en formato de texto de Prometheus 0.0.4"""
+    lineas = []
+    for metrica in list(_metricas.values()):
+        lineas.append(f"# HELP {metrica.name} {metrica.help}")
+        lineas.append(f"# TYPE {metrica.name} {metrica.tipo}")
+        lineas.extend(metrica.exponer())
+    for name, help, labelname, fn in _gauges:
+        try:
+            valor = fn()
+        except Exception:
+            continue
+        lineas.append(f"# HELP {name} {help}")
+        lineas.append(f"# TYPE {name} gauge")
+        if labelname:
+            for label, v in valor.items():
+                if isinstance(v, (int, float)):
+                    lineas.append(f"{name}{_labels((labelname,), (label,))} {v}")
+        else:
+            lineas.append(f"{name} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Métricas de la aplicación
+# ---------------------------------------------------------------------------
+
+http_requests = counter("webhook_http_requests_total", "Requests HTTP por ruta, método y status", ("route", "method", "status"))
+http_latency = histogram("webhook_http_request_seconds", "Latencia HTTP por ruta", ("route",))
+stage_latency = histogram("webhook_stage_seconds", "Latencia por etapa del procesamiento de webhooks", ("route", "stage"))
+outcomes = counter("webhook_outcomes_total", "Resultado de los handlers: saved, ignored, queued, failed", ("route", "outcome"))
+outbound_requests = counter("outbound_requests_total", "Llamadas salientes por upstream y resultado", ("upstream", "result"))
+outbound_latency = histogram("outbound_request_seconds", "Latencia de llamadas salientes", ("upstream",))
+
+
+def etapa(route: str, stage: str) -> Cronometro:
+    """with etapa("message.reply", "gemini"): ..."""
+    return Cronometro(stage_latency, (route, stage))
+
+
+def resultado(route: str, outcome: str):
+    outcomes.inc(route, outcome)
+
+
+def llamada_saliente(upstream: str, result: str, segundos: float):
+    """Registra una llamada a Gemini/Teamwork; result es ok, http_<status>, timeout o error"""
+    outbound_requests.inc(upstream, result)
+    outbound_latency.observe(segundos, upstream)
+
+
+def instrumentar(route: str):
+    """Decorador para los procesar_*: mide el handler y cuenta su resultado"""
+    def decorador(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                respuesta = await fn(*args, **kwargs)
+            except Exception:
+                resultado(route, "failed")
+                raise
+            finally:
+                stage_latency.observe(time.perf_counter() - inicio, route, "handler")
+            status = respuesta.get("status", "ok") if isinstance(respuesta, dict) else "ok"
+            resultado(route, status)
+            return respuesta
+        return wrapper
+    return decorador
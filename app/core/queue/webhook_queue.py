@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+
+from app.utilities import json_backend
+from app.utilities.json_backend import FastJSONResponse
+from app.core.observability import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cola durable de webhooks: la ruta guarda el payload crudo y responde 202,
+# un pool de workers ejecuta después la lógica de cada evento.
+base_dir = Path(__file__).resolve().parent.parent.parent.parent
+QUEUE_DB_PATH = base_dir / "develop_db" / "webhook_queue.db"
+
+Handler = Callable[..., Awaitable[dict]]
+_handlers: Dict[str, Tuple[Handler, Optional[Type[BaseModel]]]] = {}
+
+_conn: Optional[sqlite3.Connection] = None
+_wakeup: Optional[asyncio.Event] = None
+_workers: List[asyncio.Task] = []
+
+
+def queue_enabled() -> bool:
+    """Modo de ingesta por cola activado con _WEBHOOK_QUEUE_MODE_=1"""
+    return os.environ.get('_WEBHOOK_QUEUE_MODE_', '0').lower() in ('1', 'true', 'yes')
+
+
+def _config():
+    return {
+        "workers": int(os.environ.get('_WEBHOOK_QUEUE_WORKERS_', 4)),
+        "max_attempts": int(os.environ.get('_WEBHOOK_QUEUE_MAX_ATTEMPTS_', 5)),
+        "backoff": float(os.environ.get('_WEBHOOK_QUEUE_BACKOFF_', 2)),
+        "backoff_max": float(os.environ.get('_WEBHOOK_QUEUE_BACKOFF_MAX_', 300)),
+        "lease": float(os.environ.get('_WEBHOOK_QUEUE_LEASE_', 300)),
+        "poll": float(os.environ.get('_WEBHOOK_QUEUE_POLL_', 1)),
+    }
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        QUEUE_DB_PATH.parent.mkdir(exist_ok=True)
+        _conn = sqlite3.connect(QUEUE_DB_PATH, isolation_level=None, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            locked_until REAL NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_error TEXT)
+        ''')
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_webhook_queue_available ON webhook_queue (available_at)")
+        _conn.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_dead_letter (
+            id INTEGER PRIMARY KEY,
+            event TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            attempts INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            failed_at REAL NOT NULL,
+            last_error TEXT)
+        ''')
+    return _conn
+
+
+def registrar_handler(event: str, handler: Handler, model: Optional[Type[BaseModel]] = None):
+    """Registra la función que procesa un tipo de evento: handler(payload) -> dict.
+
+    Si se indica un modelo, el payload se valida con él antes de llamar al handler.
+    """
+    _handlers[event] = (handler, model)
+
+
+def encolar(event: str, body: bytes, delay: float = 0) -> int:
+    """Guarda el payload crudo en la cola y devuelve el id del job (disponible tras `delay` segundos)"""
+    now = time.time()
+    cur = _get_conn().execute(
+        "INSERT INTO webhook_queue (event, payload, available_at, created_at) VALUES (?, ?, ?, ?)",
+        (event, body, now + delay, now)
+    )
+    if _wakeup is not None:
+        _wakeup.set()
+    return cur.lastrowid
+
+
+def aceptar_webhook(event: str, body: bytes) -> FastJSONResponse:
+    """Encola el webhook y responde 202 sin esperar al procesamiento"""
+    job_id = encolar(event, body)
+    metrics.resultado(event, "queued")
+    return FastJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"status": "queued", "job_id": job_id}
+    )
+
+
+def _reclamar(lease: float) -> Optional[tuple]:
+    """Toma el siguiente job disponible (atómico entre procesos)"""
+    now = time.time()
+    return _get_conn().execute('''
+        UPDATE webhook_queue SET locked_until = ?, attempts = attempts + 1
+        WHERE id = (
+            SELECT id FROM webhook_queue
+            WHERE available_at <= ? AND locked_until <= ?
+            ORDER BY id LIMIT 1)
+        RETURNING id, event, payload, attempts, created_at
+    ''', (now + lease, now, now)).fetchone()
+
+
+def _completar(job_id: int):
+    _get_conn().execute("DELETE FROM webhook_queue WHERE id = ?", (job_id,))
+
+
+def _fallar(job: tuple, error: str, permanente: bool, cfg: dict):
+    job_id, event, payload, attempts, created_at = job
+    conn = _get_conn()
+    if permanente or attempts >= cfg["max_attempts"]:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO webhook_dead_letter
+                (id, event, payload, attempts, created_at, failed_at, last_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, event, payload, attempts, created_at, time.time(), error))
+            conn.execute("DELETE FROM webhook_queue WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.error("Job %s (%s) enviado a dead letter tras %s intentos: %s", job_id, event, attempts, error)
+    else:
+        # Backoff exponencial con jitter
+        delay = min(cfg["backoff"] * (2 ** (attempts - 1)), cfg["backoff_max"])
+        delay = delay * (0.5 + random.random() / 2)
+        conn.execute(
+            "UPDATE webhook_queue SET available_at = ?, locked_until = 0, last_error = ? WHERE id = ?",
+            (time.time() + delay, error, job_id)
+        )
+        logger.warning("Job %s (%s) falló (intento %s), reintento en %.1fs: %s", job_id, event, attempts, delay, error)
+
+
+async def _ejecutar(job: tuple, cfg: dict):
+    job_id, event, payload, attempts, created_at = job
+    if event not in _handlers:
+        _fallar(job, f"Sin handler para el evento '{event}'", True, cfg)
+        return
+    handler, model = _handlers[event]
+
+    try:
+        data = model.model_validate_json(payload) if model else json_backend.loads(payload)
+    except json_backend.JSONDecodeError:
+        _fallar(job, "Payload no es JSON válido", True, cfg)
+        return
+    except ValidationError as e:
+        _fallar(job, f"Payload inválido: {e}", True, cfg)
+        return
+
+    try:
+        await handler(data)
+    except HTTPException as e:
+        # Los errores 4xx no se resuelven reintentando
+        _fallar(job, str(e.detail), e.status_code < 500, cfg)
+    except ValidationError as e:
+        # Solo la validación del payload es permanente; un KeyError o TypeError
+        # puede ser un bug del handler y pasa por los reintentos normales
+        _fallar(job, f"Payload inválido: {e}", True, cfg)
+    except Exception as e:
+        _fallar(job, str(e), False, cfg)
+    else:
+        _completar(job_id)
+
+
+async def _worker(n: int):
+    cfg = _config()
+    while True:
+        _wakeup.clear()
+        try:
+            job = _reclamar(cfg["lease"])
+        except sqlite3.Error as e:
+            logger.error("Worker %s: error leyendo la cola: %s", n, e)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=cfg["poll"])
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await _ejecutar(job, cfg)
+        except sqlite3.Error as e:
+            # No se pudo anotar el resultado: el job se reintenta al vencer su lease
+            logger.error("Worker %s: error actualizando el job %s en la cola: %s", n, job[0], e)
+
+
+async def iniciar_workers(cantidad: Optional[int] = None):
+    """Arranca el pool de workers del proceso (acotado por _WEBHOOK_QUEUE_WORKERS_)"""
+    global _wakeup
+    _get_conn()
+    _wakeup = asyncio.Event()
+    for n in range(cantidad if cantidad is not None else _config()["workers"]):
+        _workers.append(asyncio.create_task(_worker(n)))
+    logger.info("Cola de webhooks: %s workers iniciados", len(_workers))
+
+
+async def detener_workers():
+    """Cancela los workers; los jobs en curso se reintentan al expirar su lease"""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -1,11 +1,57 @@
 import os
+import time
+import logging
+import threading
 import pymysql
 
-    
-class dbMysql:
-    
-    def conMysql():
-        client = pymysql.connect(host=os.environ.get('_HOST_MySQL_'),
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """Conexión prestada por el pool: close() la devuelve en lugar de cerrarla"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.last_used = time.monotonic()
+        self.created_at = self.last_used
+        self.returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self.returned:
+            self.returned = True
+            self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MySQLPool:
+    """Pool de conexiones pymysql por proceso.
+
+    - max_size: conexiones abiertas como máximo (en uso + ociosas)
+    - idle_recycle: segundos ociosa tras los que la conexión se cierra
+    - ping_after: segundos ociosa tras los que se valida con ping al prestarla
+    """
+
+    def __init__(self, max_size: int, idle_recycle: float, ping_after: float, wait_timeout: float):
+        self.max_size = max_size
+        self.idle_recycle = idle_recycle
+        self.ping_after = ping_after
+        self.wait_timeout = wait_timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "waits": 0, "creates": 0, "recycles": 0, "health_failures": 0}
+
+    def _connect(self):
+        return pymysql.connect(host=os.environ.get('_HOST_MySQL_'),
                     user=os.environ.get('_USER_MySQL_'),
                     password=os.environ.get('_PASS_MySQL_'),
                     db=os.environ.get('_DB_MySQL_'),
@@ -14,4 +60,102 @@ class dbMysql:
                     read_timeout=30,     # 30 seconds read timeout
                     write_timeout=30     # 30 seconds write timeout
                     )
-        return client
\ No newline at end of file
+
+    def _discard(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        self._open -= 1
+
+    def _sana(self, conn) -> bool:
+        """Health check al prestar: recicla conexiones viejas y hace ping a las ociosas"""
+        idle = time.monotonic() - conn.last_used
+        if self.idle_recycle and idle > self.idle_recycle:
+            self._stats["recycles"] += 1
+            return False
+        if idle > self.ping_after:
+            try:
+                conn._raw.ping(reconnect=False)
+            except Exception:
+                self._stats["health_failures"] += 1
+                return False
+        return True
+
+    def acquire(self) -> PooledConnection:
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            self._stats["checkouts"] += 1
+            waited = False
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._sana(conn):
+                        conn.returned = False
+                        return conn
+                    self._discard(conn)
+
+                if self._open < self.max_size:
+                    self._open += 1
+                    break
+
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise TimeoutError(f"Pool MySQL agotado ({self.max_size} conexiones en uso)")
+
+        # La conexión se abre fuera del lock para no bloquear a los demás
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["creates"] += 1
+        return PooledConnection(self, raw)
+
+    def release(self, conn: PooledConnection):
+        try:
+            # Descartar cualquier transacción sin commit antes de reutilizarla
+            conn._raw.rollback()
+            ok = True
+        except Exception:
+            ok = False
+        with self._cond:
+            if ok:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, open=self._open, idle=len(self._idle), in_use=self._open - len(self._idle))
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+
+pool = MySQLPool(
+    max_size=int(os.environ.get('_MYSQL_POOL_MAX_SIZE_', 5)),
+    idle_recycle=float(os.environ.get('_MYSQL_POOL_IDLE_RECYCLE_', 300)),
+    ping_after=float(os.environ.get('_MYSQL_POOL_PING_AFTER_', 5)),
+    wait_timeout=float(os.environ.get('_MYSQL_POOL_WAIT_TIMEOUT_', 30)),
+)
+
+
+class dbMysql:
+
+    def conMysql():
+        """Conexión del pool del proceso; llamar a close() la devuelve al pool"""
+        return pool.acquire()
+
+    def stats():
+        return pool.stats()
@@ -0,0 +1,44 @@
+from starlette.concurrency import run_in_threadpool
+
+from app.db import write_buffer
+from app.core.context import thread_context
+from app.db.database import SessionLocal, async_db_enabled, get_async_sessionmaker
+
+
+def _guardar_sync(rows):
+    db = SessionLocal()
+    try:
+        db.add_all(rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def guardar_directo(rows):
+    """Persiste las filas en una sola transacción sin bloquear el event loop.
+
+    Con _DB_ASYNC_=1 usa el motor asíncrono; si no, la sesión síncrona de
+    siempre ejecutada en el threadpool.
+    """
+    if async_db_enabled():
+        async with get_async_sessionmaker()() as db:
+            db.add_all(rows)
+            await db.commit()
+    else:
+        await run_in_threadpool(_guardar_sync, list(rows))
+
+
+async def guardar(*rows):
+    """Guarda filas de webhooks, pasando por el buffer write-behind si está activo.
+
+    Los mensajes y replies se agregan además al contexto de su hilo.
+    """
+    hilos = thread_context.turnos_por_hilo(rows)
+    if write_buffer.buffer_activo() and write_buffer.admite(rows):
+        write_buffer.agregar(rows)
+    else:
+        await guardar_directo(rows)
+    await thread_context.registrar(hilos)
@@ -0,0 +1,90 @@
+import queue
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pragmas aplicados a cada conexión nueva del pool
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -8000,  # KiB
+    "temp_store": "MEMORY",
+}
+
+
+class SQLitePool:
+    """Pool por proceso de conexiones SQLite reutilizables.
+
+    Las conexiones se crean bajo demanda hasta `size` y se devuelven al pool al
+    salir del context manager (commit si no hubo error, rollback si lo hubo).
+    """
+
+    def __init__(self, path, size: int = 4, timeout: float = 10.0,
+                 pragmas: Optional[dict] = None, on_init: Optional[Callable] = None):
+        self.path = str(path)
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self.on_init = on_init
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    conn = self._connect()
+                    if not self._initialized and self.on_init is not None:
+                        self.on_init(conn)
+                        conn.commit()
+                except Exception:
+                    self._created -= 1
+                    raise
+                self._initialized = True
+                return conn
+        return self._idle.get(timeout=self.timeout)
+
+    def _release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Cierra las conexiones ociosas del pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
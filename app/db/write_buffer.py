@@ -0,0 +1,282 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import DateTime
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.models.database.message import Message, MessageReplay, Comments, Tasks
+from app.utilities import json_backend
+
+logger = logging.getLogger(__name__)
+
+# Buffer write-behind: las filas se guardan primero en un spool SQLite local
+# (barato, sobrevive a la caída del worker) y un flusher las inserta por lotes
+# en la base principal con un solo commit. Semántica at-least-once.
+base_dir = Path(__file__).resolve().parent.parent.parent
+SPOOL_DB_PATH = base_dir / "develop_db" / "write_spool.db"
+
+MODELOS = {model.__name__: model for model in (Message, MessageReplay, Comments, Tasks)}
+
+Writer = Callable[[List], Awaitable[None]]
+
+# Errores que no se resuelven reintentando: la fila va a write_spool_failed
+ERRORES_DE_DATOS = (IntegrityError, DataError, sqlite3.IntegrityError, sqlite3.DataError)
+
+_conn: Optional[sqlite3.Connection] = None
+_pendientes = 0
+_wakeup: Optional[asyncio.Event] = None
+_flusher: Optional[asyncio.Task] = None
+_writer: Optional[Writer] = None
+
+_stats = {
+    "flushes": 0,
+    "rows": 0,
+    "failed_rows": 0,
+    "retried_rows": 0,
+    "consecutive_errors": 0,
+    "last_batch_size": 0,
+    "last_flush_seconds": 0.0,
+    "max_flush_seconds": 0.0,
+    "total_flush_seconds": 0.0,
+}
+
+
+def buffer_enabled() -> bool:
+    return os.environ.get('_DB_WRITE_BUFFER_', '0').lower() in ('1', 'true', 'yes')
+
+
+def buffer_activo() -> bool:
+    """El flusher de este proceso está corriendo"""
+    return _flusher is not None
+
+
+def _config():
+    return {
+        "size": int(os.environ.get('_DB_WRITE_BUFFER_SIZE_', 200)),
+        "interval": float(os.environ.get('_DB_WRITE_BUFFER_INTERVAL_', 1)),
+        "lease": float(os.environ.get('_DB_WRITE_BUFFER_LEASE_', 60)),
+        "retry_max": float(os.environ.get('_DB_WRITE_BUFFER_RETRY_MAX_', 60)),
+    }
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        SPOOL_DB_PATH.parent.mkdir(exist_ok=True)
+        _conn = sqlite3.connect(SPOOL_DB_PATH, isolation_level=None, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.execute('''
+        CREATE TABLE IF NOT EXISTS write_spool (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            claimed_until REAL NOT NULL DEFAULT 0)
+        ''')
+        _conn.execute('''
+        CREATE TABLE IF NOT EXISTS write_spool_failed (
+            id INTEGER PRIMARY KEY,
+            model TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            failed_at REAL NOT NULL,
+            error TEXT)
+        ''')
+    return _conn
+
+
+def admite(rows) -> bool:
+    """Solo se bufferizan los modelos de webhooks conocidos"""
+    return all(type(row).__name__ in MODELOS for row in rows)
+
+
+def _serializar(row) -> str:
+    data = {}
+    for col in row.__table__.columns:
+        if col.primary_key:
+            continue
+        value = getattr(row, col.key)
+        if value is None:
+            continue
+        data[col.key] = value.isoformat() if isinstance(value, datetime) else value
+    return json_backend.dumps_str(data)
+
+
+def _deserializar(model_name: str, data: str):
+    model = MODELOS[model_name]
+    values = json_backend.loads(data)
+    for col in model.__table__.columns:
+        if isinstance(col.type, DateTime) and values.get(col.key) is not None:
+            values[col.key] = datetime.fromisoformat(values[col.key])
+    return model(**values)
+
+
+def agregar(rows):
+    """Guarda las filas en el spool; el flusher las insertará en la base principal"""
+    global _pendientes
+    now = time.time()
+    _get_conn().executemany(
+        "INSERT INTO write_spool (model, data, created_at) VALUES (?, ?, ?)",
+        [(type(row).__name__, _serializar(row), now) for row in rows]
+    )
+    _pendientes += len(rows)
+    if _wakeup is not None and _pendientes >= _config()["size"]:
+        _wakeup.set()
+
+
+def _reclamar(size: int, lease: float) -> list:
+    now = time.time()
+    return _get_conn().execute('''
+        UPDATE write_spool SET claimed_until = ?
+        WHERE id IN (
+            SELECT id FROM write_spool WHERE claimed_until <= ?
+            ORDER BY id LIMIT ?)
+        RETURNING id, model, data, created_at
+    ''', (now + lease, now, size)).fetchall()
+
+
+def _borrar(ids: List[int]):
+    _get_conn().executemany("DELETE FROM write_spool WHERE id = ?", [(i,) for i in ids])
+
+
+def _descartar(item: tuple, error: str):
+    spool_id, model, data, created_at = item
+    conn = _get_conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO write_spool_failed (id, model, data, created_at, failed_at, error) VALUES (?, ?, ?, ?, ?, ?)",
+        (spool_id, model, data, created_at, time.time(), error)
+    )
+    conn.execute("DELETE FROM write_spool WHERE id = ?", (spool_id,))
+    _stats["failed_rows"] += 1
+    logger.error("Fila %s del spool %s descartada: %s", model, spool_id, error)
+
+
+def _liberar(ids: List[int], delay: float):
+    """Devuelve las filas al spool; se reintentan cuando vence `delay`"""
+    _get_conn().executemany("UPDATE write_spool SET claimed_until = ? WHERE id = ?",
+                            [(time.time() + delay, i) for i in ids])
+
+
+def _backoff() -> float:
+    cfg = _config()
+    return min(cfg["interval"] * 2 ** _stats["consecutive_errors"], cfg["retry_max"])
+
+
+async def flush() -> int:
+    """Inserta un lote del spool en una sola transacción y devuelve cuántas filas escribió.
+
+    Solo los errores de datos mandan una fila a write_spool_failed; ante un
+    error transitorio (base bloqueada, conexión caída) el lote vuelve al spool
+    con backoff y flush devuelve 0.
+    """
+    global _pendientes
+    cfg = _config()
+    batch = _reclamar(cfg["size"], cfg["lease"])
+    if not batch:
+        return 0
+    _pendientes = max(0, _pendientes - len(batch))
+
+    start = time.perf_counter()
+    validos = []
+    for item in batch:
+        try:
+            validos.append((item, _deserializar(item[1], item[2])))
+        except (KeyError, TypeError, ValueError) as e:
+            _descartar(item, f"No se pudo deserializar: {e}")
+
+    written = 0
+    try:
+        if validos:
+            await _writer([row for _, row in validos])
+            _borrar([item[0] for item, _ in validos])
+            written = len(validos)
+    except ERRORES_DE_DATOS as e:
+        # Un lote con una fila inválida no debe bloquear a las demás: fila por fila
+        logger.warning("Flush de %s filas falló (%s), reintentando fila por fila", len(validos), e)
+        for n, (item, _) in enumerate(validos):
+            try:
+                await _writer([_deserializar(item[1], item[2])])
+                _borrar([item[0]])
+                written += 1
+            except ERRORES_DE_DATOS as row_err:
+                _descartar(item, str(row_err))
+            except Exception as row_err:
+                _reintentar_despues([i for i, _ in validos[n:]], row_err)
+                return 0
+    except Exception as e:
+        _reintentar_despues([item for item, _ in validos], e)
+        return 0
+
+    _stats["consecutive_errors"] = 0
+    elapsed = time.perf_counter() - start
+    _stats["flushes"] += 1
+    _stats["rows"] += written
+    _stats["last_batch_size"] = len(batch)
+    _stats["last_flush_seconds"] = elapsed
+    _stats["total_flush_seconds"] += elapsed
+    _stats["max_flush_seconds"] = max(_stats["max_flush_seconds"], elapsed)
+    logger.info("💾 Write-behind: %s/%s filas en %.1f ms", written, len(batch), elapsed * 1000)
+    return len(batch)
+
+
+def _reintentar_despues(items: list, error: Exception):
+    global _pendientes
+    delay = _backoff()
+    _stats["consecutive_errors"] += 1
+    _stats["retried_rows"] += len(items)
+    _liberar([item[0] for item in items], delay)
+    _pendientes += len(items)
+    logger.warning("Flush de %s filas falló (%s); quedan en el spool, reintento en %.1fs", len(items), error, delay)
+
+
+def stats() -> dict:
+    """Métricas de flush: lotes, filas, tamaño y latencia"""
+    return dict(_stats, pending=_pendientes)
+
+
+async def _loop():
+    cfg = _config()
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=cfg["interval"])
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            # Vaciar mientras haya lotes completos
+            while await flush() >= cfg["size"]:
+                pass
+        except Exception as e:
+            logger.error("Error en el flusher write-behind: %s", e)
+
+
+async def iniciar_flusher(writer: Writer):
+    """Arranca el flusher del proceso; también recupera filas de workers caídos"""
+    global _wakeup, _flusher, _writer
+    _writer = writer
+    _get_conn()
+    _wakeup = asyncio.Event()
+    _flusher = asyncio.create_task(_loop())
+
+
+async def detener_flusher():
+    """Detiene el flusher y vacía lo pendiente antes de apagar"""
+    global _flusher
+    if _flusher is None:
+        return
+    _flusher.cancel()
+    await asyncio.gather(_flusher, return_exceptions=True)
+    _flusher = None
+    try:
+        while await flush():
+            pass
+    except Exception as e:
+        logger.error("Error vaciando el buffer write-behind: %s", e)
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+from app.models.messages.messages_model import EventCreator
+
+# Comentario creado
+class Comment(BaseModel):
+    id: int
+    body: str
+    objectId: int
+    objectType: Optional[str] = None
+    projectId: int
+    dateCreated: datetime
+    dateUpdated: Optional[datetime] = None
+
+class CommentCreatedPayload(BaseModel):
+    eventCreator: EventCreator
+    comment: Comment
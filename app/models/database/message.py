@@ -24,7 +24,7 @@ class MessageReplay(Base):
     author_id = Column(Integer)
     author_name = Column(String(200))
     post_id = Column(Integer)
-    teamwork_id = Column(Integer)
+    teamwork_id = Column(Integer, index=True)
     post_body = Column(Text)
     created_at = Column(DateTime)
 
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+
+from app.models.messages.messages_model import EventCreator
+
+# Archivo subido (todavía no se persiste)
+class FileRef(BaseModel):
+    id: int
+    name: Optional[str] = None
+    projectId: Optional[int] = None
+
+class FileUploadPayload(BaseModel):
+    eventCreator: Optional[EventCreator] = None
+    file: Optional[FileRef] = None
@@ -1,11 +1,44 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional
 from datetime import datetime
 
-# Modelo para el webhook payload
-class WebhookPayload(BaseModel):
-    event: str
-    objectType: str
-    objectId: int
-    projectId: Optional[int] = None
-    data: Dict[str, Any]
\ No newline at end of file
+# Modelos de los webhooks de Teamwork: solo se declaran los campos que se
+# persisten o se usan; el resto del JSON se ignora al validar.
+
+class EventCreator(BaseModel):
+    id: int
+    firstName: str
+    lastName: str
+    avatar: Optional[str] = None
+
+    @property
+    def full_name(self) -> str:
+        return self.firstName + " " + self.lastName
+
+# Mensaje creado
+class MessagePost(BaseModel):
+    body: str
+    userId: int
+    dateCreated: datetime
+    dateUpdated: Optional[datetime] = None
+
+class MessageData(BaseModel):
+    id: int
+    projectId: int
+    post: MessagePost
+
+class MessageCreatedPayload(BaseModel):
+    eventCreator: EventCreator
+    message: MessageData
+
+# Respuesta a un mensaje
+class MessageReplyPost(BaseModel):
+    id: int
+    body: str
+    messageId: int
+    dateCreated: datetime
+    dateUpdated: Optional[datetime] = None
+
+class MessageReplyPayload(BaseModel):
+    eventCreator: EventCreator
+    messagePost: MessageReplyPost
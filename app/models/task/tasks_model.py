@@ -1,3 +1,36 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-from datetime import datetime
\ No newline at end of file
+from typing import Optional
+from datetime import datetime
+
+from app.models.messages.messages_model import EventCreator
+
+class Project(BaseModel):
+    id: int
+    name: str
+
+class Task(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    projectId: int
+    dateCreated: datetime
+    dateUpdated: Optional[datetime] = None
+
+class TaskList(BaseModel):
+    id: int
+
+# Tarea creada
+class TaskCreatedPayload(BaseModel):
+    eventCreator: EventCreator
+    project: Project
+    task: Task
+    taskList: TaskList
+
+# Tarea actualizada (todavía no se persiste)
+class TaskRef(BaseModel):
+    id: int
+    dateUpdated: Optional[datetime] = None
+
+class TaskUpdatedPayload(BaseModel):
+    eventCreator: Optional[EventCreator] = None
+    task: TaskRef
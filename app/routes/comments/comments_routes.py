@@ -1,19 +1,23 @@
-import json
-import requests
 import os
 import logging
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends
-from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
-from datetime import datetime
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from pydantic import ValidationError
+from typing import Optional
 
 # Importaciones locales
-from app.db.database import get_db
+from app.db.persistence import guardar
 from app.utilities.utilities_messages import is_message_for_profesor_forta, init_database
 from app.utilities.raw_text import strip_html
+from app.utilities.mention_matcher import posible_mencion
 from app.models.database.message import Comments
+from app.models.comments.comments_model import CommentCreatedPayload
+from app.core.clients.gemini_client import enviar_accion, GeminiNoDisponible
+from app.core.queue.webhook_queue import queue_enabled, aceptar_webhook, registrar_handler
+from app.core.observability.logging_setup import log_payload
+from app.core.observability import metrics
+from app.core.idempotency.idempotency import idempotente
+from app.core.context.thread_context import nombre_proyecto
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -21,86 +25,94 @@ router = APIRouter()
 # Inicializar DB al arrancar
 init_database()
 
+@metrics.instrumentar("comment.create")
+@idempotente("comment.create", lambda p: (p.comment.id, p.comment.dateCreated))
+async def procesar_comment_create(payload: CommentCreatedPayload) -> dict:
+    """Procesa el evento de comentario creado"""
+    log_payload(logger, "comment.create", payload)
+
+    # Extraer variables
+    creator = payload.eventCreator
+    comment = payload.comment
+
+    #2 .- SAVE TASK CREATE 
+    with metrics.etapa("comment.create", "strip_html"):
+        post_body_raw = strip_html(comment.body)
+    if is_message_for_profesor_forta(post_body_raw):
+        new_comment = Comments(
+            autor_id = creator.id,
+            autor_name = creator.full_name,
+            projectId = comment.projectId,
+            objectId = comment.objectId,
+            objectType = comment.objectType,
+            dateCreated = comment.dateCreated,
+            body = post_body_raw)
+    
+        with metrics.etapa("comment.create", "db_commit"):
+            await guardar(new_comment)
+
+        #4 .- SEND MESSAGE TO RAG
+        logger.info("Llamando al API GEMINI (comentario %s)", comment.id)
+
+        payload = {
+                "id_project":comment.projectId,
+                "nombre_proyecto":await nombre_proyecto(comment.projectId),
+                "id_usuario":creator.id,
+                "nombre_usuario":creator.full_name,
+                "message":"extrae la informacion del archivo pdf (SLP-MP_-_Presupuesto_Adecuaciones_Proyecto_Ci (1) (5).pdf)",
+                "status":"ready"
+            }
+        try:
+            with metrics.etapa("comment.create", "gemini"):
+                mensaje_modelo = await enviar_accion(payload)
+            logger.debug("Respuesta del modelo: %s", mensaje_modelo)
+        except GeminiNoDisponible as e:
+            logger.error("GEMINI no respondió el comentario %s (%s)", comment.id, e.motivo)
+
+        return {
+                "status": "saved", 
+                "reason": "mensaje guardado"
+            }
+    else:
+        return {
+                "status": "ignored", 
+                "reason": "mensaje no dirigido al profesor forta"
+            }
+
+
 @router.post("/webhook/comment/create")
 async def teamwork_webhook(
     request: Request, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Endpoint principal del webhook de Teamwork"""
     
-    post_body_raw = ""
-    
     try:
-        # Obtener el payload
-        payload = await request.json()
-        print(payload)
-
-        # Extraer variables
-        creator_id = payload["eventCreator"]["id"]
-        creator_first_name = payload["eventCreator"]["firstName"]
-        creator_last_name = payload["eventCreator"]["lastName"]
-        creator_avatar = payload["eventCreator"]["avatar"]
-
-        comment_id = payload["comment"]["id"]
-        comment_body = payload["comment"]["body"]
-        comment_user_id = payload["comment"]["userId"]
-        comment_object_id = payload["comment"]["objectId"]
-        comment_object_type = payload["comment"]["objectType"]
-        comment_project_id = payload["comment"]["projectId"]
-        comment_notified_user_ids = payload["comment"]["notifiedUserIds"]
-        comment_date_created = payload["comment"]["dateCreated"]
-        comment_date_updated = payload["comment"]["dateUpdated"]
-
-        #2 .- SAVE TASK CREATE 
-        post_body_raw = strip_html(comment_body)
-        if is_message_for_profesor_forta(post_body_raw):
-            new_comment = Comments(
-                autor_id = creator_id,
-                autor_name = creator_first_name + " " + creator_last_name,
-                projectId = comment_project_id,
-                objectId = comment_object_id,
-                objectType = comment_object_type,
-                dateCreated = datetime.fromisoformat(comment_date_created.replace('Z', '+00:00')),
-                body = post_body_raw)
-        
-            db.add(new_comment)
-            db.commit()
-
-            #4 .- SEND MESSAGE TO RAG
-            print("::Llamando al API GEMINI::")
-
-            headers = {'X-API-Key': os.environ.get('_API_KEY_PF_')}
-
-            payload = {
-                    "id_project":506482,
-                    "nombre_proyecto":"TI TEAM",
-                    "id_usuario":creator_id,
-                    "nombre_usuario":creator_first_name + " " + creator_last_name,
-                    "message":"extrae la informacion del archivo pdf (SLP-MP_-_Presupuesto_Adecuaciones_Proyecto_Ci (1) (5).pdf)",
-                    "status":"ready"
-                }
-            req_chat_send_msg = requests.post(f"{str(os.environ.get('_URL_PF_API_GEMINAI_'))}/pf/geminia/accion",data=json.dumps(payload) ,headers=headers)
-            if req_chat_send_msg.status_code == 201:
-                aws_data_model = json.loads(req_chat_send_msg.text)
-                mensaje_modelo = aws_data_model['message']
-
-                print(mensaje_modelo)
+        body = await request.body()
 
+        # Filtro rápido sobre los bytes crudos: sin mención no se decodifica el JSON
+        if not posible_mencion(body):
+            metrics.resultado("comment.create", "ignored")
             return {
-                    "status": "saved", 
-                    "reason": "mensaje guardado"
-                }
-        else:
-            return {
-                    "status": "ignored", 
-                    "reason": "mensaje no dirigido al profesor forta"
-                }
+                "status": "ignored", 
+                "reason": "mensaje no dirigido al profesor forta"
+            }
+
+        if queue_enabled():
+            return aceptar_webhook("comment.create", body)
 
-    except json.JSONDecodeError:
-        logger.error("Error: Payload no es JSON válido")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        # Obtener y validar el payload en una sola pasada
+        with metrics.etapa("comment.create", "decode"):
+            payload = CommentCreatedPayload.model_validate_json(body)
+        return await procesar_comment_create(payload)
+
+    except ValidationError as e:
+        logger.error("Error: Payload inválido: %s errores", e.error_count())
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
     
     except Exception as e:
-        logger.error(f"Error procesando webhook: {e}")
+        logger.error("Error procesando webhook: %s", e)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+registrar_handler("comment.create", procesar_comment_create, CommentCreatedPayload)
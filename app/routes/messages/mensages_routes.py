@@ -1,20 +1,28 @@
-import json
-import requests
 import os
 import logging
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from pydantic import ValidationError
 from typing import Optional, Dict, Any
 from datetime import datetime
 
 # Importaciones locales
-from app.db.database import get_db
-#from app.models.messages.messages_model import WebhookPayload
+from app.db.persistence import guardar
+from app.models.messages.messages_model import MessageCreatedPayload, MessageReplyPayload
 from app.utilities.utilities_messages import is_message_for_profesor_forta, init_database
 from app.utilities.raw_text import strip_html
+from app.utilities.mention_matcher import posible_mencion
 from app.models.database.message import Message, MessageReplay
+from app.core.clients.gemini_client import enviar_accion, respuesta_diferida_enabled, streaming_enabled, GeminiNoDisponible
+from app.core.clients.streaming_reply import responder_en_streaming
+from app.core.clients.teamwork_client import responder_mensaje
+from app.core.clients.circuit_breaker import get_breaker
+from app.core.queue.webhook_queue import queue_enabled, aceptar_webhook, registrar_handler, encolar
+from app.utilities import json_backend
+from app.core.observability.logging_setup import log_payload
+from app.core.observability import metrics
+from app.core.idempotency.idempotency import idempotente
+from app.core.context.thread_context import contexto_hilo, nombre_proyecto, proyecto_por_defecto, registrar_respuesta
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -23,180 +31,262 @@ router = APIRouter()
 init_database()
 
 
+@metrics.instrumentar("message.create")
+@idempotente("message.create", lambda p: (p.message.id, p.message.post.dateCreated))
+async def procesar_message_create(payload: MessageCreatedPayload) -> dict:
+    """Procesa el evento de mensaje creado"""
+    logger.info("Webhook recibido: %s", payload.message.id)
+    log_payload(logger, "message.create", payload)
+    
+    #1 .- EXTRACCION DE DATOS DEL MENSAJE
+    event_creator = payload.eventCreator
+    message = payload.message
+    post = payload.message.post
+
+    #2 .- VERIFICAMOS SI ES PARA PROFESOR FORTA
+
+    with metrics.etapa("message.create", "strip_html"):
+        post_body_raw = strip_html(post.body)
+    if is_message_for_profesor_forta(post_body_raw):
+        #3 .- Guardar el mensaje
+        new_message = Message(
+            teamwork_id = message.id,
+            project_id = message.projectId,
+            author_id = post.userId,
+            author_name = event_creator.full_name,
+            author_email = event_creator.avatar,
+            created_at = post.dateCreated,
+            received_at = datetime.now(),
+            message_content = post_body_raw
+        )
+        with metrics.etapa("message.create", "db_commit"):
+            await guardar(new_message)
+        return {
+            "status": "saved", 
+            "reason": "mensaje guardado"
+        }
+    else:
+        return {
+            "status": "ignored", 
+            "reason": "mensaje no dirigido al profesor forta"
+        }
+
+
+@metrics.instrumentar("message.reply")
+@idempotente("message.reply", lambda p: (p.messagePost.id, p.messagePost.dateCreated))
+async def procesar_message_reply(payload: MessageReplyPayload) -> dict:
+    """Procesa el evento de respuesta a un mensaje y contesta con el modelo"""
+    log_payload(logger, "message.reply", payload)
+
+    #1 .- EXTRACCION DE DATOS DEL MENSAJE
+    creator_id = payload.eventCreator.id
+    creator_name = payload.eventCreator.full_name
+
+    post_id = payload.messagePost.id
+    post_body = payload.messagePost.body
+    message_id = payload.messagePost.messageId #teamwork_id
+    created_at = payload.messagePost.dateCreated
+
+
+    #2 .- VERIFICAMOS SI ES PARA PROFESOR FORTA
+
+    with metrics.etapa("message.reply", "strip_html"):
+        post_body_raw = strip_html(post_body)
+    if is_message_for_profesor_forta(post_body_raw):
+        #3 .- Guardar el mensaje
+        new_message = MessageReplay(
+            author_id = creator_id,
+            author_name = creator_name,
+            post_id = post_id,
+            teamwork_id = message_id,
+            post_body = post_body_raw,
+            created_at = created_at
+        )
+        with metrics.etapa("message.reply", "db_commit"):
+            await guardar(new_message)
+
+        #4 .- Procesar el mensaje LLM (con el contexto reciente del hilo)
+        with metrics.etapa("message.reply", "context"):
+            contexto = await contexto_hilo(message_id, excluir=f"r:{post_id}")
+            id_project = contexto.project_id or proyecto_por_defecto()
+            payload = {
+                    "id_project":id_project,
+                    "nombre_proyecto":await nombre_proyecto(id_project),
+                    "id_usuario":creator_id,
+                    "nombre_usuario":creator_name,
+                    "message":post_body_raw,
+                    "status":"ready"
+                }
+            if contexto.texto:
+                payload["contexto"] = contexto.texto
+        
+        logger.info("Llamando al API GEMINI (mensaje %s)", message_id)
+        try:
+            if streaming_enabled():
+                # El reply se publica con el primer fragmento y se edita a medida que llega el resto
+                with metrics.etapa("message.reply", "gemini_stream"):
+                    mensaje_modelo, publicado = await responder_en_streaming(message_id, payload)
+                if publicado:
+                    await registrar_respuesta(message_id, mensaje_modelo)
+                    return {
+                        "status": "saved",
+                        "reason": "mensaje guardado"
+                    }
+            else:
+                with metrics.etapa("message.reply", "gemini"):
+                    mensaje_modelo = await enviar_accion(payload)
+        except GeminiNoDisponible as e:
+            if not e.reintentable or not respuesta_diferida_enabled():
+                logger.error("GEMINI no respondió el mensaje %s (%s); no se reintenta", message_id, e.motivo)
+                return {
+                    "status": "saved",
+                    "reason": f"mensaje guardado sin respuesta del modelo ({e.motivo})"
+                }
+            # Gemini caído o circuito abierto: el mensaje ya está guardado, la respuesta se encola
+            job_id = diferir_respuesta(message_id, payload)
+            logger.warning("Sin respuesta de GEMINI (%s); mensaje %s en cola para responder después (job %s)",
+                           e.motivo, message_id, job_id)
+            return {
+                "status": "deferred",
+                "reason": f"respuesta del modelo en cola ({e.motivo})"
+            }
+        if mensaje_modelo is not None:
+            #5 .- Teamwork Reaply
+            with metrics.etapa("message.reply", "teamwork_reply"):
+                respondido = await responder_mensaje(message_id, mensaje_modelo)
+            if respondido:
+                await registrar_respuesta(message_id, mensaje_modelo)
+                logger.info("Mensaje respondido: Ok")
+
+        return {
+            "status": "saved", 
+            "reason": "mensaje guardado"
+        }
+    else:
+        return {
+            "status": "ignored", 
+            "reason": "mensaje no dirigido al profesor forta"
+        }        
+
+
+def diferir_respuesta(message_id, payload: Dict[str, Any], intento: int = 1) -> int:
+    """Encola la respuesta pendiente; se reintenta cuando el breaker vuelve a probar Gemini"""
+    cuerpo = json_backend.dumps({"message_id": message_id, "payload": payload, "intento": intento})
+    return encolar("message.reply_later", cuerpo, delay=get_breaker("gemini").reset_timeout)
+
+
+@metrics.instrumentar("message.reply_later")
+async def procesar_respuesta_diferida(data: dict) -> dict:
+    """Responde un mensaje que quedó sin respuesta porque Gemini no estaba disponible"""
+    message_id = data["message_id"]
+    try:
+        with metrics.etapa("message.reply_later", "gemini"):
+            mensaje_modelo = await enviar_accion(data["payload"])
+    except GeminiNoDisponible as e:
+        if not e.reintentable:
+            logger.error("GEMINI rechazó la respuesta diferida del mensaje %s (%s); se descarta", message_id, e.motivo)
+            return {
+                "status": "dropped",
+                "reason": f"el modelo rechazó el request ({e.motivo})"
+            }
+        intento = data.get("intento", 1)
+        if intento >= int(os.environ.get('_GEMINI_REPLY_LATER_ATTEMPTS_', 20)):
+            # La cola aplica sus reintentos propios y luego lo deja en dead letter
+            raise RuntimeError(f"API GEMINI sin respuesta tras {intento} intentos (mensaje {message_id}, {e.motivo})")
+        diferir_respuesta(message_id, data["payload"], intento + 1)
+        return {
+            "status": "deferred",
+            "reason": f"respuesta del modelo en cola ({e.motivo})"
+        }
+
+    with metrics.etapa("message.reply_later", "teamwork_reply"):
+        respondido = await responder_mensaje(message_id, mensaje_modelo)
+    if not respondido:
+        # Al reintentar, la respuesta del modelo sale de la caché
+        raise RuntimeError(f"Teamwork no aceptó la respuesta diferida del mensaje {message_id}")
+    await registrar_respuesta(message_id, mensaje_modelo)
+    logger.info("Mensaje %s respondido (diferido)", message_id)
+    return {
+        "status": "saved",
+        "reason": "respuesta diferida enviada"
+    }
+
+
 @router.post("/webhook/message/create")
 async def teamwork_webhook(
     request: Request, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Endpoint principal del webhook de Teamwork"""
     
-    post_body_raw = ""
-    
     try:
-        # Obtener el payload
-        payload = await request.json()        
-        logger.info(f"Webhook recibido: {payload['message']['id']}")
-        print(payload)
-        
-        #1 .- EXTRACCION DE DATOS DEL MENSAJE
-        # Extraer variables del eventCreator
-        event_creator_id = payload["eventCreator"]["id"]
-        event_creator_first_name = payload["eventCreator"]["firstName"]
-        event_creator_last_name = payload["eventCreator"]["lastName"]
-        event_creator_avatar = payload["eventCreator"]["avatar"]
-
-        # Extraer variables del message
-        message_id = payload["message"]["id"]
-        message_subject = payload["message"]["subject"]
-        message_status = payload["message"]["status"]
-        message_category_id = payload["message"]["categoryId"]
-        message_project_id = payload["message"]["projectId"]
-        message_tags = payload["message"]["tags"]
-
-        # Extraer variables del post
-        post_id = payload["message"]["post"]["id"]
-        post_body = payload["message"]["post"]["body"]
-        post_content_type = payload["message"]["post"]["contentType"]
-        post_status = payload["message"]["post"]["status"]
-        post_user_id = payload["message"]["post"]["userId"]
-        post_message_id = payload["message"]["post"]["messageId"]
-        post_date_created = payload["message"]["post"]["dateCreated"]
-        post_date_updated = payload["message"]["post"]["dateUpdated"]
-
-        #2 .- VERIFICAMOS SI ES PARA PROFESOR FORTA
+        body = await request.body()
 
-        post_body_raw = strip_html(post_body)
-        if is_message_for_profesor_forta(post_body_raw):
-            #3 .- Guardar el mensaje
-            new_message = Message(
-                teamwork_id = message_id,
-                project_id = message_project_id,
-                author_id = post_user_id,
-                author_name = event_creator_first_name + " " + event_creator_last_name,
-                author_email = event_creator_avatar,
-                created_at = datetime.fromisoformat(post_date_created.replace('Z', '+00:00')),
-                received_at = datetime.now(),
-                message_content = post_body_raw
-            )
-            db.add(new_message)
-            db.commit()
-            return {
-                "status": "saved", 
-                "reason": "mensaje guardado"
-            }
-        else:
+        # Filtro rápido sobre los bytes crudos: sin mención no se decodifica el JSON
+        if not posible_mencion(body):
+            metrics.resultado("message.create", "ignored")
             return {
                 "status": "ignored", 
                 "reason": "mensaje no dirigido al profesor forta"
             }
+
+        if queue_enabled():
+            return aceptar_webhook("message.create", body)
+
+        # Obtener y validar el payload en una sola pasada
+        with metrics.etapa("message.create", "decode"):
+            payload = MessageCreatedPayload.model_validate_json(body)
+        return await procesar_message_create(payload)
             
-    except json.JSONDecodeError:
-        logger.error("Error: Payload no es JSON válido")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    except ValidationError as e:
+        logger.error("Error: Payload inválido: %s errores", e.error_count())
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
     
     except Exception as e:
-        logger.error(f"Error procesando webhook: {e}")
+        logger.error("Error procesando webhook: %s", e)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
 @router.post("/webhook/message/reply")
 async def teamwork_webhook(
     request: Request, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Endpoint principal del webhook de Teamwork"""
     
-    post_body_raw = ""
-    
     try:
-        # Obtener el payload
-        payload = await request.json()        
-        print(payload)
-
-        #1 .- EXTRACCION DE DATOS DEL MENSAJE
-        creator_id = payload["eventCreator"]["id"]
-        creator_name = f'{payload["eventCreator"]["firstName"]} {payload["eventCreator"]["lastName"]}'
-        avatar_url = payload["eventCreator"]["avatar"]
-
-        post_id = payload["messagePost"]["id"]
-        post_body = payload["messagePost"]["body"]
-        message_id = payload["messagePost"]["messageId"] #teamwork_id
-        created_at = payload["messagePost"]["dateCreated"]
-        
-
-
-        post_body_raw = strip_html(post_body)
-
-        #2 .- VERIFICAMOS SI ES PARA PROFESOR FORTA
-
-        post_body_raw = strip_html(post_body)
-        if is_message_for_profesor_forta(post_body_raw):
-            #3 .- Guardar el mensaje
-            new_message = MessageReplay(
-                author_id = creator_id,
-                author_name = creator_name,
-                post_id = post_id,
-                teamwork_id = message_id,
-                post_body = post_body_raw,
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            )
-            db.add(new_message)
-            db.commit()
-
-            #4 .- Procesar el mensaje LLM
-            headers = {'X-API-Key': os.environ.get('_API_KEY_PF_')}
-            mensaje = post_body_raw.replace("\n", "").replace("\t", "")
-
-            payload = {
-                    "id_project":506482,
-                    "nombre_proyecto":"TI TEAM",
-                    "id_usuario":creator_id,
-                    "nombre_usuario":creator_name,
-                    "message":post_body_raw,
-                    "status":"ready"
-                }
-            
-            print("::Llamando al API GEMINI::")
-            req_chat_send_msg = requests.post(f"{str(os.environ.get('_URL_PF_API_GEMINAI_'))}/pf/geminia/accion",data=json.dumps(payload) ,headers=headers)
-            if req_chat_send_msg.status_code == 201:
-                aws_data_model = json.loads(req_chat_send_msg.text)
-                mensaje_modelo = aws_data_model['message']
+        body = await request.body()
 
-            
-                #5 .- Teamwork Reaply
-                payload = {
-                    "messagereply": {
-                        "body": mensaje_modelo,
-                        "notify": "" 
-                    }
-                }
-                
-                req_replay = requests.post(f"{str(os.environ.get('_URL_TEAMWORK_'))}/messages/{message_id}/messageReplies.json", data=json.dumps(payload), auth=(str(os.environ.get('_KEY_BOT_')), ''))
-                print(req_replay.text)
-                if req_replay.status_code == 201:
-                    logger.info(f"Mensaje respondido: Ok")
-
-            return {
-                "status": "saved", 
-                "reason": "mensaje guardado"
-            }
-        else:
+        # Filtro rápido sobre los bytes crudos: sin mención no se decodifica el JSON
+        if not posible_mencion(body):
+            metrics.resultado("message.reply", "ignored")
             return {
                 "status": "ignored", 
                 "reason": "mensaje no dirigido al profesor forta"
-            }        
+            }
 
-    except json.JSONDecodeError:
-        logger.error("Error: Payload no es JSON válido")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        if queue_enabled():
+            return aceptar_webhook("message.reply", body)
+
+        # Obtener y validar el payload en una sola pasada
+        with metrics.etapa("message.reply", "decode"):
+            payload = MessageReplyPayload.model_validate_json(body)
+        return await procesar_message_reply(payload)
+
+    except ValidationError as e:
+        logger.error("Error: Payload inválido: %s errores", e.error_count())
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
     
     except Exception as e:
-        logger.error(f"Error procesando webhook: {e}")
+        logger.error("Error procesando webhook: %s", e)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
+registrar_handler("message.create", procesar_message_create, MessageCreatedPayload)
+registrar_handler("message.reply", procesar_message_reply, MessageReplyPayload)
+registrar_handler("message.reply_later", procesar_respuesta_diferida)
+
+
 
 # @router.get("/messages")
 # async def get_messages(limit: int = 50, db: Session = Depends(get_db)):
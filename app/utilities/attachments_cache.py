@@ -0,0 +1,168 @@
+import os
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(file_info: dict) -> Optional[str]:
+    """Clave de versión de un archivo de Teamwork: version/size/createdAt"""
+    version = file_info.get("version") or file_info.get("versionId")
+    size = file_info.get("size")
+    created = file_info.get("createdAt") or file_info.get("uploadedAt")
+    if version is None and size is None and created is None:
+        return None
+    return f"{version}|{size}|{created}"
+
+
+class AttachmentCache:
+    """Índice en disco de los attachments ya descargados en TMP_DIR.
+
+    Cada entrada se identifica por el id de archivo de Teamwork y su clave de
+    versión; se desaloja por LRU cuando el total de bytes supera el máximo.
+    El registro en files_procceded se anota aparte por (attachment, tarea),
+    porque el mismo archivo puede estar adjunto a varias tareas.
+    """
+
+    def __init__(self, tmp_dir: Path, max_bytes: int, meta_ttl: float):
+        self.tmp_dir = Path(tmp_dir)
+        self.max_bytes = max_bytes
+        self.meta_ttl = meta_ttl
+        self.conn = sqlite3.connect(self.tmp_dir / ".attachments_index.db", isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            att_id TEXT PRIMARY KEY,
+            version_key TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT,
+            name TEXT,
+            size INTEGER,
+            fecha TEXT,
+            checked_at REAL NOT NULL,
+            last_used REAL NOT NULL)
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_attachments_last_used ON attachments (last_used)")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS attachment_tasks (
+            att_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            version_key TEXT NOT NULL,
+            PRIMARY KEY (att_id, task_id))
+        ''')
+
+    def _vigente(self, row) -> bool:
+        """El archivo sigue en disco y no fue sobrescrito por otro attachment"""
+        try:
+            st = (self.tmp_dir / row["file_name"]).stat()
+        except OSError:
+            return False
+        return st.st_size == row["bytes"] and st.st_mtime_ns == row["mtime_ns"]
+
+    def _fila(self, att_id) -> Optional[dict]:
+        cur = self.conn.execute(
+            "SELECT att_id, version_key, file_name, bytes, mtime_ns, sha256, name, size, fecha, checked_at "
+            "FROM attachments WHERE att_id = ?", (str(att_id),)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def buscar(self, att_id, key: Optional[str] = None) -> Optional[dict]:
+        """Devuelve la entrada si el archivo ya está descargado en la versión indicada.
+
+        Sin clave (no hay metadatos aún) solo se confía en entradas revisadas
+        hace menos de meta_ttl segundos.
+        """
+        row = self._fila(att_id)
+        if row is None or not self._vigente(row):
+            return None
+        now = time.time()
+        if key is None:
+            if now - row["checked_at"] > self.meta_ttl:
+                return None
+        elif row["version_key"] != key:
+            return None
+        else:
+            self.conn.execute("UPDATE attachments SET checked_at = ? WHERE att_id = ?", (now, str(att_id)))
+        self.conn.execute("UPDATE attachments SET last_used = ? WHERE att_id = ?", (now, str(att_id)))
+        return row
+
+    def guardar(self, att_id, key: str, file_name: str, sha256: Optional[str], meta: dict):
+        """Registra un archivo recién descargado y aplica el desalojo LRU"""
+        st = (self.tmp_dir / file_name).stat()
+        now = time.time()
+        self.conn.execute('''
+            INSERT OR REPLACE INTO attachments
+            (att_id, version_key, file_name, bytes, mtime_ns, sha256, name, size, fecha, checked_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (str(att_id), key, file_name, st.st_size, st.st_mtime_ns, sha256,
+              meta.get("name"), meta.get("size"), meta.get("fecha"), now, now))
+        self._desalojar(keep=str(att_id))
+
+    def registrados(self, task_id, att_ids) -> Set[str]:
+        """Ids de los attachments ya insertados en files_procceded para esta tarea y versión"""
+        ids = [str(att_id) for att_id in att_ids]
+        if not ids:
+            return set()
+        cur = self.conn.execute(
+            "SELECT t.att_id FROM attachment_tasks t JOIN attachments a "
+            "ON a.att_id = t.att_id AND a.version_key = t.version_key "
+            f"WHERE t.task_id = ? AND t.att_id IN ({','.join('?' * len(ids))})",
+            (str(task_id), *ids)
+        )
+        return {row[0] for row in cur.fetchall()}
+
+    def marcar_registrados(self, task_id, att_ids):
+        """Anota los attachments como insertados en files_procceded para la tarea.
+
+        Se guarda la versión vigente en el cache: si el archivo cambia, vuelve a registrarse.
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO attachment_tasks (att_id, task_id, version_key) "
+            "SELECT att_id, ?, version_key FROM attachments WHERE att_id = ?",
+            [(str(task_id), str(att_id)) for att_id in att_ids]
+        )
+
+    def _desalojar(self, keep: str):
+        if not self.max_bytes:
+            return
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM attachments").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cur = self.conn.execute(
+            "SELECT att_id, file_name, bytes, mtime_ns FROM attachments WHERE att_id != ? ORDER BY last_used",
+            (keep,)
+        )
+        for att_id, file_name, size, mtime_ns in cur.fetchall():
+            if total <= self.max_bytes:
+                break
+            path = self.tmp_dir / file_name
+            if self._vigente({"file_name": file_name, "bytes": size, "mtime_ns": mtime_ns}):
+                path.unlink(missing_ok=True)
+            self.conn.execute("DELETE FROM attachments WHERE att_id = ?", (att_id,))
+            self.conn.execute("DELETE FROM attachment_tasks WHERE att_id = ?", (att_id,))
+            total -= size
+            logger.info("🗑️ Attachment %s desalojado del cache (%s)", att_id, file_name)
+
+
+_caches: Dict[Path, AttachmentCache] = {}
+
+
+def get_attachment_cache(tmp_dir: Path) -> AttachmentCache:
+    """Cache de attachments del proceso para el directorio indicado"""
+    tmp_dir = Path(tmp_dir)
+    if tmp_dir not in _caches:
+        _caches[tmp_dir] = AttachmentCache(
+            tmp_dir,
+            max_bytes=int(os.environ.get('_TW_ATTACHMENT_CACHE_MAX_BYTES_', 1024 ** 3)),
+            meta_ttl=float(os.environ.get('_TW_ATTACHMENT_META_TTL_', 600)),
+        )
+    return _caches[tmp_dir]
@@ -0,0 +1,59 @@
+import os
+import json
+import logging
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Backend JSON intercambiable: orjson si está instalado (extra "fast-json"),
+# si no la librería estándar. _JSON_BACKEND_ fuerza uno: auto | orjson | stdlib.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def _elegir_backend() -> str:
+    pedido = os.environ.get('_JSON_BACKEND_', 'auto').lower()
+    if pedido == 'stdlib':
+        return 'stdlib'
+    if orjson is None:
+        if pedido == 'orjson':
+            logger.warning("_JSON_BACKEND_=orjson pero orjson no está instalado, se usa stdlib")
+        return 'stdlib'
+    return 'orjson'
+
+
+BACKEND = _elegir_backend()
+
+if BACKEND == 'orjson':
+    JSONDecodeError = orjson.JSONDecodeError  # subclase de json.JSONDecodeError
+
+    def dumps(obj: Any) -> bytes:
+        """Serializa a bytes UTF-8 compactos"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        return orjson.loads(data)
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    def dumps(obj: Any) -> bytes:
+        """Serializa a bytes UTF-8 compactos"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse renderizada con el backend configurado"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
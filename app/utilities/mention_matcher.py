@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Tabla por defecto: bot -> alias. Se puede reemplazar con un JSON del mismo
+# formato indicado en _BOT_ALIASES_FILE_, que se recarga en caliente.
+DEFAULT_ALIASES = {
+    "profesor_forta": [
+        "@profesor forta",
+        "@profesorforta",
+        "@profesorf",
+    ],
+}
+
+
+class Mencion(NamedTuple):
+    bot: str
+    alias: str
+    start: int
+    end: int
+
+
+class MentionMatcher:
+    """Matcher multi-patrón: una sola regex precompilada para todos los alias"""
+
+    def __init__(self, aliases: Dict[str, List[str]]):
+        self.bots_por_alias: Dict[str, List[str]] = {}
+        for bot, lista in aliases.items():
+            for alias in lista:
+                alias = alias.strip().lower()
+                if alias:
+                    self.bots_por_alias.setdefault(alias, []).append(bot)
+        # Alias más largos primero para que "@profesorforta" gane a "@profesorf"
+        patrones = sorted(self.bots_por_alias, key=len, reverse=True)
+        self.regex = re.compile("|".join(re.escape(a) for a in patrones), re.I) if patrones else None
+        self.prefiltro = self._compilar_prefiltro()
+
+    def _compilar_prefiltro(self):
+        """Regex sobre los bytes crudos del request (antes de decodificar el JSON).
+
+        Usa solo el inicio ASCII de cada alias (p.ej. "@profesor") y acepta la
+        arroba escapada en HTML o JSON o seguida de tags (crudos o con los
+        signos escapados en JSON), así que nunca descarta una mención real.
+        """
+        arroba = rb"(?:@|&#64;|&#x40;|&commat;|\\u0040)(?:<[^>]{0,200}>|\\u003c.{0,200}?\\u003e)*"
+        prefijos = set()
+        for alias in self.bots_por_alias:
+            con_arroba = alias.startswith("@")
+            cuerpo = alias[1:] if con_arroba else alias
+            prefijo = re.match(r"[a-z0-9_.\-]*", cuerpo).group(0)
+            if not prefijo:
+                return None
+            prefijos.add((con_arroba, prefijo))
+        if not prefijos:
+            return None
+        # Si un prefijo contiene a otro basta con el más corto
+        minimos = [
+            (c, p) for c, p in prefijos
+            if not any((oc, op) != (c, p) and (oc == c or not oc) and p.startswith(op) for oc, op in prefijos)
+        ]
+        return re.compile(b"|".join(
+            (arroba if c else b"") + re.escape(p.encode()) for c, p in minimos
+        ), re.I)
+
+    def posible_mencion(self, raw: bytes) -> bool:
+        """Filtro rápido: False garantiza que el body no menciona a ningún bot"""
+        if self.regex is None:
+            return False
+        if self.prefiltro is None:
+            return True
+        return self.prefiltro.search(raw) is not None
+
+    def buscar(self, text: str, max_chars: int = 0, limite: int = 0) -> List[Mencion]:
+        """Menciones en el texto con su bot y offsets.
+
+        max_chars acota la porción escaneada (0 = todo el texto) y limite corta
+        la búsqueda tras N menciones (0 = todas).
+        """
+        if not text or self.regex is None:
+            return []
+        endpos = min(len(text), max_chars) if max_chars else len(text)
+        menciones = []
+        for match in self.regex.finditer(text, 0, endpos):
+            alias = match.group(0).lower()
+            for bot in self.bots_por_alias[alias]:
+                menciones.append(Mencion(bot, alias, match.start(), match.end()))
+            if limite and len(menciones) >= limite:
+                break
+        return menciones
+
+
+_matcher: Optional[MentionMatcher] = None
+_origen_mtime: Optional[float] = None
+_revisado_en = 0.0
+
+
+def _cargar_aliases() -> Dict[str, List[str]]:
+    path = os.environ.get('_BOT_ALIASES_FILE_')
+    if not path:
+        return DEFAULT_ALIASES
+    with open(path, encoding="utf-8") as fh:
+        aliases = json.load(fh)
+    # Formato esperado: {"bot": ["@alias", ...], ...}
+    if not isinstance(aliases, dict):
+        raise ValueError("se esperaba un objeto bot -> lista de alias")
+    for bot, lista in aliases.items():
+        if not isinstance(lista, list) or not all(isinstance(a, str) for a in lista):
+            raise ValueError(f"los alias de {bot!r} deben ser una lista de textos")
+    return aliases
+
+
+def get_matcher() -> MentionMatcher:
+    """Matcher vigente; recompila si el archivo de alias cambió"""
+    global _matcher, _origen_mtime, _revisado_en
+    now = time.monotonic()
+    if _matcher is not None and now - _revisado_en < float(os.environ.get('_BOT_ALIASES_RELOAD_SECONDS_', 5)):
+        return _matcher
+    _revisado_en = now
+
+    path = os.environ.get('_BOT_ALIASES_FILE_')
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError as e:
+        logger.error("No se pudo leer el archivo de alias %s: %s", path, e)
+        mtime = _origen_mtime
+
+    if _matcher is None or mtime != _origen_mtime:
+        try:
+            _matcher = MentionMatcher(_cargar_aliases())
+            _origen_mtime = mtime
+            logger.info("Alias de bots cargados: %s", len(_matcher.bots_por_alias))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error("Alias de bots inválidos, se mantiene la tabla anterior: %s", e)
+            if _matcher is None:
+                _matcher = MentionMatcher(DEFAULT_ALIASES)
+    return _matcher
+
+
+def _max_chars() -> int:
+    return int(os.environ.get('_MENTION_SCAN_KB_', 0)) * 1024
+
+
+def buscar_menciones(content: str, limite: int = 0) -> List[Mencion]:
+    return get_matcher().buscar(content, _max_chars(), limite)
+
+
+def bots_mencionados(content: str) -> Set[str]:
+    return {m.bot for m in buscar_menciones(content)}
+
+
+def posible_mencion(raw: bytes) -> bool:
+    """Chequeo sobre el body crudo para ignorar eventos sin decodificar el JSON"""
+    return get_matcher().posible_mencion(raw)
+
+
+def es_para_bot(content: str, bot: str) -> bool:
+    """Verifica si el contenido menciona al bot indicado"""
+    return any(m.bot == bot for m in buscar_menciones(content))
+
+
+def quitar_menciones(content: str) -> str:
+    """Texto sin los alias de bots (para comparar prompts sin la mención)"""
+    regex = get_matcher().regex
+    return regex.sub(" ", content) if regex is not None and content else content
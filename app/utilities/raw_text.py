@@ -1,3 +1,5 @@
+import re
+from html import unescape
 from html.parser import HTMLParser
 
 class HTMLStripper(HTMLParser):
@@ -12,7 +14,35 @@ class HTMLStripper(HTMLParser):
     def get_data(self):
         return ''.join(self.fed)
 
+# Extractor de una sola pasada: los patrones se compilan una vez por proceso.
+# Comentarios y tags se eliminan; <br> y los tags de bloque se vuelven salto de línea.
+_BLOCK_TAGS = "br|p|div|li|ul|ol|tr|table|h[1-6]|blockquote|pre"
+# Cuerpo del tag: los valores entre comillas pueden contener '>'. Fuera de
+# comillas un '<' corta el tag (queda como texto) y el cuantificador posesivo
+# no retrocede, así que muchos tags sin cerrar se recorren en tiempo lineal.
+_ATTRS = r"""(?:"[^"]*"|'[^']*'|[^<>'"])*+"""
+_TAG_RE = re.compile(
+    r"<!--.*?(?:-->|$)"                                # comentarios
+    r"|<(/?(?:" + _BLOCK_TAGS + r"))\b" + _ATTRS + ">"  # tags de bloque -> grupo 1
+    r"|</?[a-zA-Z]" + _ATTRS + ">"                     # cualquier otro tag
+    r"|<[!?][^<>]*>",                                   # doctype / processing instructions
+    re.S | re.I,
+)
+_NEWLINES_RE = re.compile(r"[ \t]*\n[\s]*")
+
+
+def _reemplazo(match):
+    return "\n" if match.group(1) else ""
+
+
 def strip_html(html):
-    stripper = HTMLStripper()
-    stripper.feed(html)
-    return stripper.get_data()
+    """Texto plano de un body HTML de Teamwork, con entidades decodificadas"""
+    if not html:
+        return ""
+    text = _TAG_RE.sub(_reemplazo, html)
+    if "&" in text:
+        text = unescape(text)
+    text = text.replace("\xa0", " ")
+    if "\n" in text:
+        text = _NEWLINES_RE.sub("\n", text)
+    return text.strip()
@@ -0,0 +1,146 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from app.core.clients.teamwork_client import TeamworkClient
+from app.utilities.attachments_cache import get_attachment_cache, version_key
+from app.utilities import json_backend
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Un semáforo por host de Teamwork para acotar las descargas concurrentes
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _limite_host(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(int(os.environ.get('_TW_MAX_CONCURRENCY_PER_HOST_', 4)))
+    return _host_semaphores[host]
+
+
+def _max_bytes() -> int:
+    """Tamaño máximo permitido por archivo (0 = sin límite)"""
+    return int(os.environ.get('_TW_MAX_ATTACHMENT_BYTES_', 0))
+
+
+class ArchivoDemasiadoGrande(Exception):
+    pass
+
+
+async def _descargar_archivo(client: TeamworkClient, preview_url: str, file_path: Path) -> Optional[dict]:
+    """Descarga el archivo por chunks a un temporal y lo renombra de forma atómica.
+
+    La memoria usada es constante (un chunk) sin importar el tamaño del archivo.
+    Devuelve el sha256 y los bytes escritos, o None si no se pudo descargar.
+    """
+    file_name = file_path.name
+    max_bytes = _max_bytes()
+    tmp_path = file_path.with_name(f".{file_name}.{uuid.uuid4().hex}.part")
+    try:
+        async with _limite_host(preview_url):
+            async with client.stream("GET", preview_url, timeout=15, follow_redirects=True) as file_resp:
+                if file_resp.status_code != 200:
+                    logger.warning("No se pudo descargar %s (%s)", file_name, file_resp.status_code)
+                    return None
+
+                content_length = int(file_resp.headers.get("content-length") or 0)
+                if max_bytes and content_length > max_bytes:
+                    raise ArchivoDemasiadoGrande(f"{content_length} bytes > {max_bytes}")
+
+                digest = hashlib.sha256()
+                written = 0
+                with open(tmp_path, "wb") as fh:
+                    async for chunk in file_resp.aiter_bytes(CHUNK_SIZE):
+                        written += len(chunk)
+                        if max_bytes and written > max_bytes:
+                            raise ArchivoDemasiadoGrande(f"más de {max_bytes} bytes")
+                        digest.update(chunk)
+                        fh.write(chunk)
+
+        os.replace(tmp_path, file_path)
+        logger.info("📥 Archivo descargado: %s (%s bytes)", file_path, written)
+        return {"sha256": digest.hexdigest(), "bytes": written}
+
+    except ArchivoDemasiadoGrande as e:
+        logger.warning("Archivo %s excede el tamaño máximo: %s", file_name, e)
+    except Exception as e:
+        logger.error("Error descargando %s: %s", file_name, e)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return None
+
+
+def _desde_cache(entry: dict) -> dict:
+    return {
+        "name": entry["name"],
+        "size": entry["size"],
+        "fecha": entry["fecha"],
+        "sha256": entry["sha256"],
+        "cached": True
+    }
+
+
+async def _procesar_attachment(client: TeamworkClient, att_ref: dict, tmp_dir: Path) -> Optional[dict]:
+    """Obtiene los metadatos de un attachment y descarga su archivo si no está en cache"""
+    att_id = att_ref["id"]
+    cache = get_attachment_cache(tmp_dir)
+    try:
+        # Si la referencia de la tarea ya trae la versión (o el índice es reciente) no hay tráfico de red
+        entry = cache.buscar(att_id, version_key(att_ref))
+        if entry:
+            return _desde_cache(entry)
+
+        # Obtener metadatos del archivo
+        att_url = f"/files/{att_id}.json"
+        async with _limite_host(client.base_url):
+            resp = await client.get(att_url, timeout=10)
+
+        if resp.status_code != 200:
+            logger.warning("⚠️ No se pudo recuperar attachment %s: %s", att_id, resp.status_code)
+            return None
+
+        file_info = json_backend.loads(resp.content).get("file", {})
+        data = {
+            "name": file_info.get("name"),
+            "size": file_info.get("size"),
+            "fecha": file_info.get("createdAt"),
+            "cached": False
+        }
+
+        key = version_key(file_info)
+        if key:
+            entry = cache.buscar(att_id, key)
+            if entry:
+                return _desde_cache(entry)
+
+        # Descargar archivo desde preview-url
+        preview_url = file_info.get("preview-url") or file_info.get("preview-URL")
+        if preview_url:
+            file_name = file_info.get("name", f"{att_id}.file")
+            descarga = await _descargar_archivo(client, preview_url, tmp_dir / file_name)
+            if descarga:
+                data["sha256"] = descarga["sha256"]
+                if key:
+                    cache.guardar(att_id, key, file_name, descarga["sha256"], data)
+
+        return data
+
+    except Exception as e:
+        logger.error("Error procesando attachment %s: %s", att_id, e)
+        return None
+
+
+async def obtener_attachments(attachments: List[dict], client: TeamworkClient, tmp_dir: Path) -> Dict:
+    """Recupera metadatos y archivos de todos los attachments de forma concurrente"""
+    results = await asyncio.gather(*(
+        _procesar_attachment(client, att, tmp_dir) for att in attachments
+    ))
+    return {att["id"]: data for att, data in zip(attachments, results) if data is not None}
@@ -2,6 +2,7 @@ import json
 import logging
 from sqlalchemy.orm import Session
 from app.db.database import engine, Base
+from app.utilities.mention_matcher import es_para_bot
 
 logger = logging.getLogger(__name__)
 
@@ -57,17 +58,5 @@ def is_message_for_profesor_forta(content: str) -> bool:
     if not content:
         return False
     
-    content_lower = content.lower()
-    
-    # Buscar menciones directas
-    forta_mentions = [
-        "@profesor forta",
-        "@profesorforta",
-        "@profesorf" 
-    ]
-    
-    for mention in forta_mentions:
-        if mention in content_lower:
-            return True
-    
-    return False
\ No newline at end of file
+    # Buscar menciones directas (alias configurables en mention_matcher)
+    return es_para_bot(content, "profesor_forta")
@@ -1,18 +1,25 @@
 # Libs System
 import os
 import json
+import time
 import base64
 import binascii
 
 # Libs FASTAPI
 from typing import Optional
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, Request, HTTPException, status
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import OAuth2PasswordBearer
 from starlette.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, PlainTextResponse
 from dotenv import load_dotenv
+from app.core.observability.logging_setup import configurar_logging, registros_descartados
+
+# Logging en cola antes de importar las rutas, para que sus logs ya no bloqueen
+load_dotenv()
+configurar_logging()
 
 #=============START ROUTE HERES=============#
 from app.core.auth import autenticate
@@ -21,10 +28,40 @@ from app.routes.task import task_routes
 from app.routes.comments import comments_routes
 from app.routes.documents import documents_routes
 #=============END ROUTE HERES================#
+from app.core.clients.http_client import close_http_client
+from app.core.queue import webhook_queue
+from app.db import database, persistence, write_buffer
+from app.utilities.json_backend import FastJSONResponse
+from app.core.observability import metrics
+from app.db.db import dbMysql
+from app.core.idempotency.idempotency import get_store as idempotency_store
+from app.core.clients.teamwork_client import teamwork_stats
+from app.core.clients.circuit_breaker import breaker_states
+from app.core.clients.gemini_client import respuesta_diferida_enabled
 
-load_dotenv()
 
-app = FastAPI(swagger_static={})
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if database.async_db_enabled():
+        await database.init_async_database()
+    # Buffer write-behind: inserts de webhooks agrupados en un solo commit
+    if write_buffer.buffer_enabled():
+        await write_buffer.iniciar_flusher(persistence.guardar_directo)
+    # Modo acknowledge-then-process: los workers consumen la cola de webhooks
+    if webhook_queue.queue_enabled():
+        await webhook_queue.iniciar_workers()
+    elif respuesta_diferida_enabled():
+        # Sin modo cola igual hace falta un worker para las respuestas diferidas
+        await webhook_queue.iniciar_workers(1)
+    yield
+    await webhook_queue.detener_workers()
+    await write_buffer.detener_flusher()
+    # Cerrar el pool de conexiones HTTP salientes
+    await close_http_client()
+    await database.close_async_database()
+
+# Respuestas renderizadas con el backend JSON rápido (orjson si está instalado)
+app = FastAPI(swagger_static={}, lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 # Set all CORS enabled origins
@@ -57,6 +94,7 @@ def custom_openapi():
 
 @app.middleware('http')
 async def authenticate(request: Request, call_next):
+    inicio = time.perf_counter()
 
     # -------------------- Authentication basic scheme -----------------------------
     if "Authorization" in request.headers:
@@ -66,7 +104,8 @@ async def authenticate(request: Request, call_next):
             if scheme.lower() == 'basic':
                 decoded = base64.b64decode(credentials).decode("ascii")
                 username, _, password = decoded.partition(":")
-                request.state.user = await autenticate.authenticate_user(username, password)
+                with metrics.etapa("http", "auth"):
+                    request.state.user = await autenticate.authenticate_user(username, password)
         except (ValueError, UnicodeDecodeError, binascii.Error):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,6 +113,12 @@ async def authenticate(request: Request, call_next):
             )
 
     response = await call_next(request)
+
+    # Se etiqueta con la plantilla de la ruta (no la URL) para acotar la cardinalidad
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.http_requests.inc(path, request.method, response.status_code)
+    metrics.http_latency.observe(time.perf_counter() - inicio, path)
     return response
 
 # ================= Routers inclusion from src directory ===============
@@ -85,6 +130,18 @@ async def root():
     """Endpoint de verificación"""
     return {"message": "Webhook Teamwork - Profesor Forta activo", "status": "running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.exponer(), media_type="text/plain; version=0.0.4")
+
+metrics.gauge_fn("mysql_pool", "Estado del pool MySQL del proceso", dbMysql.stats, labelname="stat")
+metrics.gauge_fn("write_buffer", "Estado del buffer write-behind", write_buffer.stats, labelname="stat")
+metrics.gauge_fn("idempotency", "Claims, duplicados (LRU/SQLite) y liberaciones", lambda: idempotency_store().stats, labelname="stat")
+metrics.gauge_fn("teamwork_client", "Requests, conexiones nuevas, reuso y handshake ahorrado", teamwork_stats, labelname="stat")
+metrics.gauge_fn("circuit_breaker_state", "Estado del breaker por upstream: 0 closed, 1 half_open, 2 open", breaker_states, labelname="upstream")
+metrics.gauge_fn("log_records_dropped", "Registros de log descartados por cola llena", registros_descartados)
+
 app.include_router(autenticate.router)
 app.include_router(mensages_routes.router)
 app.include_router(task_routes.router)
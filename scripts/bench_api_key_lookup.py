@@ -0,0 +1,97 @@
+"""Lookups de API keys sin caché: conexión por llamada contra SQLitePool.
+
+Crea una base api_keys temporal y mide cuántas consultas por segundo hace cada
+proceso durante `segundos`, con 1 y con N procesos en paralelo (el total es
+la suma de todos).
+
+Uso: python scripts/bench_api_key_lookup.py [procesos] [segundos]
+"""
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.sqlite_pool import SQLitePool  # noqa: E402
+
+CLAVES = 1000
+CONSULTA = 'SELECT is_active, user_name, role FROM api_keys WHERE api_key = ?'
+
+
+def crear_base(path: Path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE api_keys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_name TEXT NOT NULL,
+        role TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        api_key TEXT NOT NULL UNIQUE)
+    ''')
+    conn.executemany(
+        "INSERT INTO api_keys (user_name, role, is_active, api_key) VALUES (?, 'dev', 'true', ?)",
+        [(f"user{i}", f"key-{i}") for i in range(CLAVES)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def por_llamada(path: Path, segundos: float) -> int:
+    # Comportamiento anterior: sqlite3.connect en cada lookup
+    n = 0
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(CONSULTA, (f"key-{random.randrange(CLAVES)}",)).fetchone()
+        finally:
+            conn.close()
+        n += 1
+    return n
+
+
+def con_pool(path: Path, segundos: float) -> int:
+    pool = SQLitePool(path, size=4)
+    n = 0
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        with pool.connection() as conn:
+            conn.execute(CONSULTA, (f"key-{random.randrange(CLAVES)}",)).fetchone()
+        n += 1
+    pool.close()
+    return n
+
+
+def medir(fn, path: Path, procesos: int, segundos: float) -> float:
+    with multiprocessing.Pool(procesos) as pool:
+        total = sum(pool.starmap(fn, [(path, segundos)] * procesos))
+    return total / segundos
+
+
+def main():
+    procesos = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "api_keys.db"
+        crear_base(path)
+        # El pool activa WAL en la primera conexión; se aplica antes de medir ambos modos
+        wal = SQLitePool(path, size=1)
+        with wal.connection():
+            pass
+        wal.close()
+
+        print(f"{'procesos':<10}{'conexión por llamada /s':>25}{'SQLitePool /s':>16}{'speedup':>9}")
+        for n in sorted({1, procesos}):
+            viejo = medir(por_llamada, path, n, segundos)
+            nuevo = medir(con_pool, path, n, segundos)
+            print(f"{n:<10}{viejo:>25,.0f}{nuevo:>16,.0f}{nuevo / viejo:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Latencia del event loop mientras hay una llamada a Gemini pendiente.
+
+Levanta un stub de /pf/geminia/accion que tarda `demora` segundos y mide el
+retraso máximo de una tarea que hace ticks de 10 ms (lo que esperaría un GET /)
+mientras se llama al stub de dos formas:
+
+- bloqueante: POST síncrono dentro de la corrutina (como antes con requests.post)
+- async: gemini_client.enviar_accion sobre el cliente httpx compartido
+
+Uso: python scripts/bench_gemini_event_loop.py [demora_segundos]
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEMORA = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        time.sleep(DEMORA)
+        body = b'{"message": "ok"}'
+        self.send_response(201)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+async def medir(llamada) -> float:
+    """Retraso máximo (ms) de un tick de 10 ms mientras corre la llamada"""
+    peor = 0.0
+    fin = asyncio.Event()
+
+    async def sonda():
+        nonlocal peor
+        while not fin.is_set():
+            inicio = time.perf_counter()
+            await asyncio.sleep(0.01)
+            peor = max(peor, (time.perf_counter() - inicio - 0.01) * 1000)
+
+    tarea = asyncio.create_task(sonda())
+    await asyncio.sleep(0.05)
+    await llamada()
+    fin.set()
+    await tarea
+    return peor
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    os.environ['_URL_PF_API_GEMINAI_'] = url
+    os.environ.setdefault('_GEMINI_TIMEOUT_', str(DEMORA + 10))
+    # Sin caché, coalescing ni limitador: solo la llamada HTTP
+    os.environ['_LLM_CACHE_TTL_'] = '0'
+    os.environ['_LLM_COALESCE_'] = '0'
+    os.environ['_RATE_LIMIT_ENABLED_'] = '0'
+
+    from app.core.clients.gemini_client import enviar_accion
+    from app.core.clients.http_client import close_http_client, get_http_client
+
+    # El cliente (contexto TLS, backend de red) se calienta una vez, como al arrancar la app
+    await get_http_client().get(url)
+    payload = {"id_project": 1, "id_usuario": 1, "message": "hola", "status": "ready"}
+
+    async def bloqueante():
+        httpx.post(f"{url}/pf/geminia/accion", json=payload, timeout=DEMORA + 10)
+
+    async def asincrona():
+        await enviar_accion(payload)
+
+    print(f"Stub de Gemini con {DEMORA:.1f}s de demora")
+    print(f"{'modo':<12}{'peor retraso del loop (ms)':>28}")
+    for nombre, llamada in (("bloqueante", bloqueante), ("async", asincrona)):
+        print(f"{nombre:<12}{await medir(llamada):>28.1f}")
+
+    await close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""loads/dumps por payload: json de la librería estándar contra orjson.
+
+No hay un corpus capturado en el repo, así que se generan `cantidad` payloads
+sintéticos de message-created (bodies HTML de 0.3-4 KB). Como referencia se
+mide también model_validate_json, que usan las rutas tipadas.
+
+Uso: python scripts/bench_json_backend.py [cantidad]
+"""
+import sys
+import json
+import random
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.messages.messages_model import MessageCreatedPayload  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PARRAFO = '<p>Revisión del <b>presupuesto</b> &amp; avance de obra, ver <a href="https://x.teamwork.com/#/tasks/{i}">tarea {i}</a></p>'
+
+
+def payload(i: int, rnd: random.Random) -> dict:
+    body = '<span class="mention">@Profesor Forta</span> ' + "".join(
+        PARRAFO.format(i=i + j) for j in range(rnd.randint(2, 30))
+    )
+    return {
+        "eventCreator": {"id": 1000 + i, "firstName": "Ana", "lastName": "Pérez", "avatar": "https://x/a.png"},
+        "message": {
+            "id": i, "projectId": 42, "title": f"Hilo {i}", "status": "active", "tags": [],
+            "post": {"body": body, "userId": 1000 + i, "dateCreated": "2025-01-15T10:20:30Z"},
+        },
+        "project": {"id": 42, "name": "Proyecto"},
+    }
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rnd = random.Random(7)
+    objetos = [payload(i, rnd) for i in range(cantidad)]
+    crudos = [json.dumps(o, ensure_ascii=False).encode() for o in objetos]
+    kb = sum(len(c) for c in crudos) / cantidad / 1024
+
+    def por_payload(fn, datos):
+        def correr():
+            for d in datos:
+                fn(d)
+        return min(timeit.repeat(correr, number=5, repeat=5)) / 5 / len(datos) * 1e6
+
+    stdlib_dumps = lambda o: json.dumps(o, ensure_ascii=False, separators=(",", ":")).encode("utf-8")  # noqa: E731
+    filas = [
+        ("loads", "stdlib", por_payload(json.loads, crudos)),
+        ("dumps", "stdlib", por_payload(stdlib_dumps, objetos)),
+    ]
+    if orjson is not None:
+        filas += [
+            ("loads", "orjson", por_payload(orjson.loads, crudos)),
+            ("dumps", "orjson", por_payload(lambda o: orjson.dumps(o, option=orjson.OPT_NON_STR_KEYS), objetos)),
+        ]
+    else:
+        print("orjson no está instalado (pip install -e '.[fast-json]'): solo se mide stdlib")
+    filas.append(("validate", "pydantic", por_payload(MessageCreatedPayload.model_validate_json, crudos)))
+
+    print(f"{cantidad} payloads, {kb:.1f} KB en promedio")
+    print(f"{'operación':<10}{'backend':<10}{'us/payload':>12}")
+    for op, backend, us in sorted(filas):
+        print(f"{op:<10}{backend:<10}{us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Eventos ignorados por segundo: decodificar el JSON contra el prefiltro sobre bytes.
+
+Genera `cantidad` payloads sintéticos de comment-created (bodies HTML de
+0.3-4 KB) sin mención al bot y mide cuántos eventos por segundo descarta cada
+camino:
+
+- json.loads + strip_html + matcher (comportamiento anterior)
+- model_validate_json + strip_html + matcher (lo que pagan los eventos que pasan el filtro)
+- mention_matcher.posible_mencion sobre el body crudo
+
+Al final cuenta cuántos de los payloads con mención pasan el prefiltro (deben ser todos).
+
+Uso: python scripts/bench_mention_prefilter.py [cantidad]
+"""
+import sys
+import json
+import random
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.comments.comments_model import CommentCreatedPayload  # noqa: E402
+from app.utilities.mention_matcher import posible_mencion  # noqa: E402
+from app.utilities.raw_text import strip_html  # noqa: E402
+from app.utilities.utilities_messages import is_message_for_profesor_forta  # noqa: E402
+
+PARRAFO = '<p>Revisión del <b>presupuesto</b> &amp; avance de obra, ver <a href="https://x.teamwork.com/#/tasks/{i}">tarea {i}</a> @ana</p>'
+MENCIONES = ["@profesorf", "@Profesor Forta", "&#64;profesorforta", '<span class="mention">@</span>profesorf']
+
+
+def payload(i: int, rnd: random.Random, mencion: str = "") -> bytes:
+    body = mencion + " " + "".join(PARRAFO.format(i=i + j) for j in range(rnd.randint(2, 30)))
+    return json.dumps({
+        "eventCreator": {"id": 1000 + i, "firstName": "Ana", "lastName": "Pérez", "avatar": "https://x/a.png"},
+        "comment": {
+            "id": i, "body": body, "objectId": 500 + i, "objectType": "task", "projectId": 42,
+            "dateCreated": "2025-01-15T10:20:30Z",
+        },
+    }, ensure_ascii=False).encode()
+
+
+def decodificar(raw: bytes) -> bool:
+    data = json.loads(raw)
+    return is_message_for_profesor_forta(strip_html(data["comment"]["body"]))
+
+
+def validar(raw: bytes) -> bool:
+    data = CommentCreatedPayload.model_validate_json(raw)
+    return is_message_for_profesor_forta(strip_html(data.comment.body))
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rnd = random.Random(7)
+    sin_mencion = [payload(i, rnd) for i in range(cantidad)]
+    con_mencion = [payload(i, rnd, MENCIONES[i % len(MENCIONES)]) for i in range(cantidad)]
+    kb = sum(len(c) for c in sin_mencion) / cantidad / 1024
+
+    def por_evento(fn):
+        def correr():
+            for raw in sin_mencion:
+                fn(raw)
+        return min(timeit.repeat(correr, number=5, repeat=5)) / 5 / cantidad
+
+    filas = [
+        ("json.loads + strip_html", por_evento(decodificar)),
+        ("model_validate_json + strip_html", por_evento(validar)),
+        ("prefiltro (bytes)", por_evento(posible_mencion)),
+    ]
+
+    print(f"{cantidad} payloads sin mención, {kb:.1f} KB en promedio")
+    print(f"{'camino':<34}{'us/evento':>11}{'eventos/s':>12}")
+    for camino, seg in filas:
+        print(f"{camino:<34}{seg * 1e6:>11.1f}{1 / seg:>12,.0f}")
+
+    falsos_negativos = sum(not posible_mencion(raw) for raw in con_mencion)
+    ignorados = sum(decodificar(raw) for raw in sin_mencion)
+    print(f"con mención descartados por el prefiltro: {falsos_negativos}/{cantidad}; "
+          f"sin mención aceptados por el matcher: {ignorados}/{cantidad}")
+
+
+if __name__ == "__main__":
+    main()
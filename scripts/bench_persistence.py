@@ -0,0 +1,70 @@
+"""Throughput de persistence.guardar: sesión síncrona en threadpool contra motor async.
+
+Guarda `total` filas de Tasks (como task/create) con `concurrencia` corrutinas
+en paralelo sobre una base SQLite temporal, primero con la sesión síncrona de
+siempre y luego con _DB_ASYNC_=1 (aiosqlite). Ambos modos hacen un commit por
+fila, así que el techo lo pone el fsync de cada commit.
+
+Uso: python scripts/bench_persistence.py [total] [concurrencia]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db import database, persistence  # noqa: E402
+from app.models.database.message import Tasks  # noqa: E402
+
+
+def tarea(i: int) -> Tasks:
+    return Tasks(
+        id_task=i, taskListId=1, task_name=f"Tarea {i}", id_project=1, project_name="Bench",
+        id_usuario=1, name_usuario="bench", description="<p>descripción</p>" * 20,
+        dateCreated=datetime.now(),
+    )
+
+
+async def medir(total: int, concurrencia: int) -> float:
+    cola = iter(range(total))
+
+    async def cliente():
+        for i in cola:
+            await persistence.guardar(tarea(i))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    return total / (time.perf_counter() - inicio)
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrencia = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "teamwork_messages.db"
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        database.Base.metadata.create_all(engine)
+        database.SessionLocal.configure(bind=engine)
+
+        print(f"{total} filas, concurrencia {concurrencia}")
+        print(f"{'modo':<8}{'filas/s':>10}")
+        os.environ['_DB_ASYNC_'] = '0'
+        print(f"{'sync':<8}{await medir(total, concurrencia):>10.0f}")
+
+        os.environ['_DB_ASYNC_'] = '1'
+        os.environ['_ASYNC_DATABASE_URL_'] = f"sqlite+aiosqlite:///{path}"
+        await database.init_async_database()
+        print(f"{'async':<8}{await medir(total, concurrencia):>10.0f}")
+        await database.close_async_database()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""Costo por KB de strip_html contra el HTMLStripper anterior.
+
+Uso: python scripts/bench_strip_html.py [repeticiones]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utilities.raw_text import HTMLStripper, strip_html  # noqa: E402
+
+
+def html_stripper(html):
+    s = HTMLStripper()
+    s.feed(html)
+    s.close()
+    return s.get_data().strip()
+
+
+FILA = ('<tr><td class="c" style="width:120px">Partida &amp; concepto</td>'
+        '<td><span data-id="12">$ 1,200.00</span></td><td><img src="https://x/y.png" alt="a > b"></td></tr>')
+CUERPOS = {
+    "mensaje corto": '<p><span class="mention">@Profesor Forta</span> cual es el avance&nbsp;del proyecto?</p>',
+    "comentario con imágenes": '<div>' + '<p>Revisión <b>hecha</b><br><img src="https://x/a.png"></p>' * 40 + '</div>',
+    "tabla (~24 KB)": '<table>' + FILA * 150 + '</table>',
+}
+
+
+def main():
+    reps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'cuerpo':<26}{'KB':>7}{'HTMLStripper us/KB':>21}{'strip_html us/KB':>19}{'speedup':>9}")
+    for nombre, html in CUERPOS.items():
+        kb = len(html.encode()) / 1024
+        viejo = min(timeit.repeat(lambda: html_stripper(html), number=reps, repeat=3)) / reps
+        nuevo = min(timeit.repeat(lambda: strip_html(html), number=reps, repeat=3)) / reps
+        print(f"{nombre:<26}{kb:>7.1f}{viejo / kb * 1e6:>21.1f}{nuevo / kb * 1e6:>19.1f}{viejo / nuevo:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
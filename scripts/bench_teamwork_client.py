@@ -0,0 +1,118 @@
+"""TeamworkClient contra un stub TLS local: pool keep-alive y reintentos.
+
+1. `llamadas` GETs secuenciales con un cliente httpx nuevo por llamada
+   (comportamiento anterior) contra el TeamworkClient con el pool del proceso,
+   más sus estadísticas de reuso (conexiones nuevas, reuse ratio, handshake ahorrado).
+2. Un POST de reply al que el stub responde dos 429 con Retry-After: 1 y
+   luego 201: mide el tiempo hasta la respuesta exitosa.
+
+Necesita el binario openssl para generar un certificado autofirmado.
+
+Uso: python scripts/bench_teamwork_client.py [llamadas]
+"""
+import os
+import ssl
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ['_RATE_LIMIT_ENABLED_'] = '0'
+
+from app.core.clients import http_client  # noqa: E402
+from app.core.clients.teamwork_client import TeamworkClient  # noqa: E402
+
+
+class StubTeamwork(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sin Nagle: con keep-alive, headers y body en escrituras separadas esperarían el ACK retardado
+    disable_nagle_algorithm = True
+    rechazos = 0
+
+    def _responder(self, status: int, body: bytes = b"{}", headers: dict = None):
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._responder(200, b'{"task": {"id": 1, "attachments": []}}')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        if StubTeamwork.rechazos < 2:
+            StubTeamwork.rechazos += 1
+            self._responder(429, headers={"retry-after": "1"})
+        else:
+            self._responder(201, b'{"id": "99"}')
+
+    def log_message(self, *args):
+        pass
+
+
+def certificado(tmp: Path):
+    cert, key = tmp / "cert.pem", tmp / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", str(key), "-out", str(cert), "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+async def main():
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = certificado(Path(tmp))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubTeamwork)
+        ctx_server = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx_server.load_cert_chain(cert, key)
+        server.socket = ctx_server.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"https://127.0.0.1:{server.server_port}"
+
+        # Anterior: cliente (y contexto TLS) nuevo en cada llamada
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            async with httpx.AsyncClient(verify=ssl.create_default_context(cafile=cert)) as client:
+                await client.get(f"{base}/projects/api/v3/tasks/1.json", auth=("k", "x"))
+        viejo = (time.perf_counter() - inicio) / llamadas
+
+        # Actual: el cliente compartido del proceso, confiando en el certificado del stub
+        http_client._client = httpx.AsyncClient(verify=ssl.create_default_context(cafile=cert))
+        tw = TeamworkClient(base, ("k", "x"))
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            await tw.get("/projects/api/v3/tasks/1.json")
+        nuevo = (time.perf_counter() - inicio) / llamadas
+        stats = tw.stats()
+
+        print(f"{llamadas} GETs secuenciales contra el stub TLS")
+        print(f"  cliente nuevo por llamada: {viejo * 1000:.1f} ms/llamada")
+        print(f"  TeamworkClient (pool):     {nuevo * 1000:.1f} ms/llamada")
+        print(f"  conexiones nuevas: {stats['new_connections']}, reuse ratio: {stats['reuse_ratio']:.3f}, "
+              f"handshake ahorrado: {stats['handshake_saved_seconds']:.2f}s")
+
+        inicio = time.perf_counter()
+        resp = await tw.post_json("/messages/1/messageReplies.json", {"messagereply": {"body": "hola"}})
+        print(f"POST con dos 429 (Retry-After: 1): {resp.status_code} tras {time.perf_counter() - inicio:.2f}s, "
+              f"{tw.stats()['retries']} reintentos")
+
+        await http_client.close_http_client()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
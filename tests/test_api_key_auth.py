@@ -0,0 +1,128 @@
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.auth import api_key_auth, autenticate
+
+
+class FakeCursor:
+    def __init__(self, driver):
+        self.driver = driver
+        self.lastrowid = None
+        self._row = None
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.driver.queries.append(sql)
+        if sql.startswith("SELECT is_active, user_name, role FROM api_keys WHERE api_key"):
+            user = self.driver.users.get(params[0])
+            self._row = (user["is_active"], user["user_name"], user["role"]) if user else None
+        elif sql.startswith("SELECT 1 FROM api_keys WHERE user_name"):
+            existe = any(u["user_name"] == params[0] for u in self.driver.users.values())
+            self._row = (1,) if existe else None
+        elif sql.startswith("INSERT INTO api_keys"):
+            user_name, role, is_active, created_at, last_login, api_key = params
+            self.lastrowid = len(self.driver.users) + 1
+            self.driver.users[api_key] = {
+                "id": self.lastrowid, "user_name": user_name, "role": role, "is_active": is_active,
+                "created_at": created_at, "last_login": last_login,
+            }
+            self._row = None
+        elif sql.startswith("SELECT * FROM api_keys WHERE id"):
+            self._row = next(
+                ((u["id"], u["user_name"], u["role"], u["is_active"], u["created_at"], u["last_login"], k)
+                 for k, u in self.driver.users.items() if u["id"] == params[0]),
+                None,
+            )
+        else:
+            raise AssertionError(f"SQL inesperado: {sql}")
+
+    def fetchone(self):
+        return self._row
+
+
+class FakeDriver:
+    """Reemplaza al pool SQLite: guarda usuarios en memoria y registra las consultas"""
+
+    def __init__(self):
+        self.users = {}
+        self.queries = []
+
+    @contextmanager
+    def connection(self):
+        yield SimpleNamespace(cursor=lambda: FakeCursor(self), commit=lambda: None)
+
+    def lookups(self):
+        return sum(1 for q in self.queries if q.startswith("SELECT is_active"))
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    driver = FakeDriver()
+    monkeypatch.setattr(api_key_auth, "api_keys_pool", driver)
+    monkeypatch.setattr(autenticate, "api_keys_pool", driver)
+    return driver
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(api_key_auth, "time", reloj)
+    cache = api_key_auth.ApiKeyCache(maxsize=8, ttl=300, negative_ttl=30)
+    monkeypatch.setattr(api_key_auth, "api_key_cache", cache)
+    return reloj
+
+
+def test_hit_no_consulta_la_base(driver, reloj):
+    driver.users["k1"] = {"user_name": "ana", "role": "dev", "is_active": "true"}
+
+    assert api_key_auth.lookup_api_key("k1") == (True, "ana", "dev")
+    assert api_key_auth.lookup_api_key("k1") == (True, "ana", "dev")
+    assert api_key_auth.verify_api_key("k1")
+    assert driver.lookups() == 1
+
+
+def test_clave_desconocida_queda_en_cache_negativa(driver, reloj):
+    assert api_key_auth.lookup_api_key("mala") is None
+    assert not api_key_auth.verify_api_key("mala")
+    assert driver.lookups() == 1
+
+    # La entrada negativa vence antes que las positivas
+    reloj.ahora += 31
+    assert api_key_auth.lookup_api_key("mala") is None
+    assert driver.lookups() == 2
+
+
+def test_ttl_vencido_vuelve_a_consultar(driver, reloj):
+    driver.users["k1"] = {"user_name": "ana", "role": "dev", "is_active": "true"}
+    api_key_auth.lookup_api_key("k1")
+
+    driver.users["k1"]["is_active"] = "false"
+    reloj.ahora += 299
+    assert api_key_auth.verify_api_key("k1")
+    reloj.ahora += 2
+    assert not api_key_auth.verify_api_key("k1")
+    assert driver.lookups() == 2
+
+
+def test_alta_de_usuario_invalida_la_entrada_negativa(driver, reloj, monkeypatch):
+    monkeypatch.setattr(autenticate, "generar_password", lambda password: "k-nueva")
+    assert not api_key_auth.verify_api_key("k-nueva")
+
+    user = api_key_auth.UserModel(user_name="ana", role="dev", is_active="true", api_keys="secreto")
+    resp = asyncio.run(autenticate.create_user(user))
+
+    assert resp.status_code == 201
+    assert api_key_auth.verify_api_key("k-nueva")
+    assert api_key_auth.get_api_key_user("k-nueva") == "ana"
+    assert driver.lookups() == 2
@@ -0,0 +1,71 @@
+import os
+import re
+import json
+
+import pytest
+
+from app.utilities.mention_matcher import DEFAULT_ALIASES, MentionMatcher
+
+
+@pytest.fixture
+def matcher():
+    return MentionMatcher(DEFAULT_ALIASES)
+
+
+# Bodies crudos como llegan en el webhook: la mención puede venir con la
+# arroba escapada o con tags (crudos o escapados por el serializador JSON)
+CON_MENCION = [
+    b'{"body":"@Profesor Forta hola"}',
+    b'{"body":"\\u0040profesorf hola"}',
+    b'{"body":"&#64;profesorforta"}',
+    b'{"body":"@<span class=\\"m\\">Profesor</span> Forta"}',
+    b'{"body":"@\\u003cspan\\u003eProfesor"}',
+    b'{"body":"@\\u003cspan class=\\"m\\"\\u003e\\u003cb\\u003eprofesorf"}',
+    b'{"body":"\\u0040\\u003cSPAN\\u003eProfesor Forta"}',
+]
+
+SIN_MENCION = [
+    b'{"body":"hola equipo"}',
+    b'{"body":"profesor sin arroba"}',
+    b'{"body":"@otro usuario"}',
+]
+
+
+@pytest.mark.parametrize("raw", CON_MENCION)
+def test_prefiltro_acepta_menciones(matcher, raw):
+    assert matcher.posible_mencion(raw)
+
+
+@pytest.mark.parametrize("raw", SIN_MENCION)
+def test_prefiltro_descarta_sin_mencion(matcher, raw):
+    assert not matcher.posible_mencion(raw)
+
+
+@pytest.mark.parametrize("raw", CON_MENCION + SIN_MENCION)
+def test_prefiltro_nunca_descarta_una_mencion_real(matcher, raw):
+    # Si el texto decodificado (sin tags) menciona al bot, el prefiltro debe dejarlo pasar
+    texto = re.sub(r"<[^>]*>", "", json.loads(raw)["body"]).replace("&#64;", "@")
+    if matcher.buscar(texto):
+        assert matcher.posible_mencion(raw)
+
+
+@pytest.mark.parametrize("contenido", [
+    '["@profesorf"]',
+    '{"profesor_forta": "@profesorf"}',
+    '{"profesor_forta": [1, 2]}',
+    '{"profesor_forta": ',
+])
+def test_alias_invalidos_mantienen_el_matcher_anterior(tmp_path, monkeypatch, contenido):
+    from app.utilities import mention_matcher
+
+    archivo = tmp_path / "aliases.json"
+    archivo.write_text('{"otro_bot": ["@otrobot"]}', encoding="utf-8")
+    monkeypatch.setenv("_BOT_ALIASES_FILE_", str(archivo))
+    monkeypatch.setenv("_BOT_ALIASES_RELOAD_SECONDS_", "0")
+    monkeypatch.setattr(mention_matcher, "_matcher", None)
+    monkeypatch.setattr(mention_matcher, "_origen_mtime", None)
+    assert mention_matcher.bots_mencionados("hola @otrobot") == {"otro_bot"}
+
+    archivo.write_text(contenido, encoding="utf-8")
+    os.utime(archivo, (0, 0))
+    assert mention_matcher.bots_mencionados("hola @otrobot") == {"otro_bot"}
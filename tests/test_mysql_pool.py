@@ -0,0 +1,166 @@
+import threading
+import time
+
+import pytest
+
+from app.db import db
+
+
+class FakeConnection:
+    """Conexión pymysql simulada: registra ping/rollback/close"""
+
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+        self.ping_falla = False
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.ping_falla:
+            raise ConnectionError("MySQL server has gone away")
+
+    def rollback(self):
+        if self.closed:
+            raise ConnectionError("conexión cerrada")
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self):
+        return f"cursor-{self.n}"
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+
+@pytest.fixture
+def conexiones(monkeypatch):
+    creadas = []
+
+    def connect(**kwargs):
+        conn = FakeConnection(len(creadas))
+        creadas.append(conn)
+        return conn
+
+    monkeypatch.setattr(db.pymysql, "connect", connect)
+    return creadas
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(db, "time", reloj)
+    return reloj
+
+
+def _pool(**kwargs):
+    cfg = {"max_size": 2, "idle_recycle": 300, "ping_after": 5, "wait_timeout": 1}
+    cfg.update(kwargs)
+    return db.MySQLPool(**cfg)
+
+
+def test_reusa_la_conexion_devuelta(conexiones, reloj):
+    pool = _pool()
+    with pool.acquire() as conn:
+        assert conn.cursor() == "cursor-0"
+    with pool.acquire() as conn:
+        assert conn.cursor() == "cursor-0"
+
+    assert len(conexiones) == 1
+    assert not conexiones[0].closed
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["creates"], stats["waits"]) == (2, 1, 0)
+    assert (stats["open"], stats["idle"], stats["in_use"]) == (1, 1, 0)
+
+
+def test_close_doble_no_duplica_la_conexion(conexiones, reloj):
+    pool = _pool()
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_agotado_lanza_timeout(conexiones):
+    pool = _pool(max_size=1, wait_timeout=0.05)
+    ocupada = pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["waits"], stats["creates"]) == (2, 1, 1)
+    ocupada.close()
+
+
+def test_espera_a_que_se_libere_una_conexion(conexiones):
+    pool = _pool(max_size=1, wait_timeout=2)
+    ocupada = pool.acquire()
+    threading.Timer(0.05, ocupada.close).start()
+
+    inicio = time.monotonic()
+    conn = pool.acquire()
+    assert time.monotonic() - inicio < 1
+    assert conn._raw is conexiones[0]
+
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["waits"], stats["creates"]) == (2, 1, 1)
+    conn.close()
+
+
+def test_recicla_conexiones_ociosas(conexiones, reloj):
+    pool = _pool(idle_recycle=300)
+    pool.acquire().close()
+
+    reloj.ahora += 301
+    with pool.acquire() as conn:
+        assert conn._raw is conexiones[1]
+
+    assert conexiones[0].closed
+    stats = pool.stats()
+    assert (stats["recycles"], stats["creates"], stats["open"]) == (1, 2, 1)
+
+
+def test_ping_solo_tras_ping_after(conexiones, reloj):
+    pool = _pool(ping_after=5)
+    pool.acquire().close()
+
+    reloj.ahora += 1
+    pool.acquire().close()
+    assert conexiones[0].pings == 0
+
+    reloj.ahora += 10
+    pool.acquire().close()
+    assert conexiones[0].pings == 1
+    assert pool.stats()["creates"] == 1
+
+
+def test_reemplaza_la_conexion_que_falla_el_ping(conexiones, reloj):
+    pool = _pool(ping_after=5)
+    pool.acquire().close()
+    conexiones[0].ping_falla = True
+
+    reloj.ahora += 10
+    with pool.acquire() as conn:
+        assert conn._raw is conexiones[1]
+
+    assert conexiones[0].closed
+    stats = pool.stats()
+    assert (stats["health_failures"], stats["creates"], stats["open"]) == (1, 2, 1)
+
+
+def test_error_al_conectar_libera_el_lugar(monkeypatch, reloj):
+    def connect(**kwargs):
+        raise ConnectionError("sin servidor")
+
+    monkeypatch.setattr(db.pymysql, "connect", connect)
+    pool = _pool(max_size=1)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()["open"] == 0
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from app.utilities.raw_text import HTMLStripper, strip_html
+
+
+def _html_stripper(html):
+    """Extractor anterior (HTMLParser por llamada), como referencia"""
+    s = HTMLStripper()
+    s.feed(html)
+    s.close()
+    return s.get_data().strip()
+
+
+# Bodies con el formato que envía Teamwork en mensajes y comentarios
+INLINE = [
+    '<span class="mention" data-id="1">@Profesor Forta</span> cual es el avance?',
+    '@<span>Profesor</span> <b>Forta</b> revisa el <a href="https://x.teamwork.com/#/tasks/1?a=1&amp;b=2">link</a>',
+    'Hola &amp; bienvenidos &lt;equipo&gt; &quot;TI&quot;',
+    'a <img alt="x > y" src=z> b',
+    '<span data-x=\'{"a":">"}\'>@profesorf</span>',
+    'texto <!-- comentario <b>oculto</b> --> visible',
+    '<strong><em>negrita itálica</em></strong> y <code>x &lt; 3</code>',
+    '2 < 3 y 5 > 4',
+]
+
+GOLDEN = [
+    ('<p>Hola</p><p>@Profesor Forta</p>', 'Hola\n@Profesor Forta'),
+    ('linea 1<br>linea 2<br/>linea 3', 'linea 1\nlinea 2\nlinea 3'),
+    ('<div>uno&nbsp;dos</div>', 'uno dos'),
+    ('<ul><li>a</li><li>b</li></ul>', 'a\nb'),
+    ('<table><tr><td>c1</td><td>c2</td></tr><tr><td>c3</td></tr></table>', 'c1c2\nc3'),
+    ('<h2 title="a>b">Título</h2>texto', 'Título\ntexto'),
+    ('<p class="x">  espacios  </p>\n\n\n<p>fin</p>', 'espacios\nfin'),
+    ('', ''),
+]
+
+
+@pytest.mark.parametrize("html", INLINE)
+def test_inline_igual_a_html_stripper(html):
+    assert strip_html(html) == _html_stripper(html)
+
+
+@pytest.mark.parametrize("html,esperado", GOLDEN)
+def test_golden(html, esperado):
+    assert strip_html(html) == esperado
+
+
+def test_atributos_con_mayor_no_filtran_texto():
+    assert '"}' not in strip_html('<span data-x=\'{"a":">"}\'>@profesorf</span>')
+    assert strip_html('a <img alt="x > y" src=z> b') == 'a  b'
+
+
+@pytest.mark.parametrize("unidad", ['<a ', '<a "', "<a b='", '<a b="c" ', '</p ', '<!x'])
+def test_tags_sin_cerrar_en_tiempo_lineal(unidad):
+    # Un body de ~24 KB con tags sin cerrar no debe trabar el event loop
+    html = '@profesorf ' + unidad * 8000
+    inicio = time.perf_counter()
+    texto = strip_html(html)
+    assert time.perf_counter() - inicio < 0.5
+    assert texto.startswith('@profesorf')
+
+
+def test_tag_sin_cerrar_queda_como_texto():
+    assert strip_html('a <b c="x > y">d</b> <p 2 < 3') == 'a d <p 2 < 3'